@@ -1,13 +1,251 @@
 import os
-from typing import Set, List, Optional, Dict, Any
-from dataclasses import dataclass, field
-from datetime import datetime
-import yaml
+import re
+import sys
+import copy
+import pickle
+import fnmatch
+import functools
+import importlib.util
+import pprint
+from typing import Set, FrozenSet, List, Optional, Dict, Any, Tuple
+from dataclasses import dataclass, field, fields
 import logging
+from utils import json_utils
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# yaml模块在首次读写配置文件时才导入，避免只使用默认配置时的导入开销
+_yaml = None
+
+
+def _get_yaml():
+    """
+    获取yaml模块（首次调用时导入）
+    
+    Returns:
+        module: yaml模块
+    """
+    global _yaml
+    if _yaml is None:
+        import yaml
+        _yaml = yaml
+    return _yaml
+
+# YAML解析结果的缓存文件后缀（与配置文件放在同一目录）
+YAML_CACHE_SUFFIX = '.pkl'
+
+# compile_to_module 生成的配置模块文件名
+GENERATED_CONFIG_NAME = '_generated_config.py'
+
+# load_header 读取的配置文件开头字节数
+CONFIG_HEADER_SIZE = 4096
+
+# 进程内配置缓存: 配置文件绝对路径 -> ((修改时间ns, 文件大小), 配置实例)
+_CONFIG_CACHE: Dict[str, Tuple[Tuple[int, int], 'Config']] = {}
+
+
+def _read_yaml_cache(cache_path: str, cache_key: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+    """
+    读取YAML解析结果缓存
+    
+    Args:
+        cache_path: 缓存文件路径
+        cache_key: 配置文件的(修改时间ns, 文件大小)
+        
+    Returns:
+        Optional[Dict[str, Any]]: 缓存的配置数据，缓存不存在或已过期时返回None
+    """
+    try:
+        with open(cache_path, 'rb') as f:
+            stored_key, config_data = pickle.load(f)
+        if stored_key == cache_key:
+            return config_data
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"读取配置缓存失败 {cache_path}: {e}")
+    return None
+
+
+def _write_yaml_cache(cache_path: str, cache_key: Tuple[int, int], config_data: Dict[str, Any]) -> None:
+    """
+    原子地写入YAML解析结果缓存
+    
+    Args:
+        cache_path: 缓存文件路径
+        cache_key: 配置文件的(修改时间ns, 文件大小)
+        config_data: 配置数据
+    """
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((cache_key, config_data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        # 缓存只是加速手段，写入失败不影响配置加载
+        logger.warning(f"写入配置缓存失败 {cache_path}: {e}")
+
+def _generated_config_path(config_path: str) -> str:
+    """获取配置文件对应的生成模块路径（与配置文件放在同一目录）"""
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)), GENERATED_CONFIG_NAME)
+
+
+def _read_generated_config(config_path: str, cache_key: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+    """
+    读取由配置文件生成的Python模块
+    
+    Args:
+        config_path: 配置文件路径
+        cache_key: 配置文件的(修改时间ns, 文件大小)
+        
+    Returns:
+        Optional[Dict[str, Any]]: 配置数据，模块不存在或已过期时返回None
+    """
+    module_path = _generated_config_path(config_path)
+    if not os.path.exists(module_path):
+        return None
+    
+    try:
+        spec = importlib.util.spec_from_file_location('_generated_config', module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        
+        if (module.__source_path__ == os.path.abspath(config_path)
+                and (module.__source_mtime__, module.__source_size__) == cache_key):
+            return module.CONFIG
+        logger.debug(f"生成的配置模块已过期，忽略: {module_path}")
+    except Exception as e:
+        logger.warning(f"读取生成的配置模块失败 {module_path}: {e}")
+    return None
+
+
+def _yaml_loader(yaml):
+    """优先使用libyaml提供的C实现，未安装时回退到纯Python实现"""
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def _load_yaml_data(config_path: str, cache_key: Tuple[int, int]) -> Dict[str, Any]:
+    """
+    读取YAML配置文件的原始数据（优先使用解析缓存）
+    
+    Args:
+        config_path: 配置文件路径
+        cache_key: 配置文件的(修改时间ns, 文件大小)
+        
+    Returns:
+        Dict[str, Any]: 配置数据
+    """
+    # 优先使用 compile_to_module 生成的Python模块，其次使用解析缓存
+    config_data = _read_generated_config(config_path, cache_key)
+    if config_data is not None:
+        return config_data
+    
+    cache_path = config_path + YAML_CACHE_SUFFIX
+    config_data = _read_yaml_cache(cache_path, cache_key)
+    if config_data is None:
+        yaml = _get_yaml()
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config_data = yaml.load(f, Loader=_yaml_loader(yaml)) or {}
+        _write_yaml_cache(cache_path, cache_key, config_data)
+    return config_data
+
+
+@functools.lru_cache(maxsize=8)
+def _compile_globs(patterns: FrozenSet[str], flags: int = 0) -> 're.Pattern':
+    """
+    将一组glob模式合并编译为一个正则表达式（相同模式集合只编译一次）
+    
+    Args:
+        patterns: glob模式集合（必须可哈希）
+        flags: 正则表达式标志
+        
+    Returns:
+        re.Pattern: 合并后的正则表达式，模式为空时返回永不匹配的表达式
+    """
+    if not patterns:
+        return re.compile(r'(?!)')
+    return re.compile('|'.join(fnmatch.translate(p) for p in patterns), flags)
+
+
+# 默认文件模式
+_DEFAULT_FILE_PATTERNS = frozenset({
+    "*.mp4",   # 视频文件
+    "*.mkv",
+    "*.avi",
+    "*.m4v",
+    "*.srt",   # 字幕文件
+    "*.ass",
+    "*.ssa"
+})
+
+# 默认排除模式
+_DEFAULT_EXCLUDE_PATTERNS = frozenset({
+    "**/BDMV/**",          # 蓝光目录
+    "**/CERTIFICATE/**",    # 证书目录
+    "**/@eaDir/**",        # Synology缩略图目录
+    "**/lost+found/**"     # 系统恢复目录
+})
+
+# 默认忽略的文件/目录名（临时文件和系统生成的文件）
+_DEFAULT_IGNORE_GLOBS = frozenset({
+    "*.tmp",         # 临时文件
+    "*.part",        # 未完成的下载
+    ".DS_Store",     # macOS目录元数据
+    "__pycache__",   # Python缓存目录
+    ".git"           # Git仓库目录
+})
+
+# 形如 "**/目录名/**" 的排除模式，可以直接用子串判断
+_DIR_PATTERN_RE = re.compile(r'^\*\*/([^*?\[\]/]+)/\*\*$')
+# 形如 "*.扩展名" 的文件模式，可以直接用扩展名判断
+_EXT_PATTERN_RE = re.compile(r'^\*(\.[^*?\[\]/.]+)$')
+
+
+def _extract_exclude_literals(patterns) -> Tuple[Tuple[str, ...], bool]:
+    """
+    从排除模式中提取目录名子串
+    
+    Args:
+        patterns: 排除模式集合
+        
+    Returns:
+        Tuple[Tuple[str, ...], bool]: (子串列表, 是否所有模式都能用子串精确判断)
+    """
+    literals = []
+    exact = True
+    for pattern in patterns:
+        m = _DIR_PATTERN_RE.match(pattern)
+        if m:
+            literals.append(f"/{m.group(1)}/")
+        else:
+            exact = False
+    return tuple(literals), exact
+
+
+def _extract_include_exts(patterns) -> Optional[frozenset]:
+    """
+    从文件模式中提取扩展名集合
+    
+    Args:
+        patterns: 文件模式集合
+        
+    Returns:
+        Optional[frozenset]: 小写扩展名集合，存在无法用扩展名判断的模式时返回None
+    """
+    exts = set()
+    for pattern in patterns:
+        m = _EXT_PATTERN_RE.match(pattern)
+        if not m:
+            return None
+        exts.add(m.group(1).lower())
+    return frozenset(exts)
+
+
+# Python 3.10+ 使用 __slots__ 减少实例内存并加快属性访问
+_DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_OPTIONS)
 class Config:
     """配置类"""
     
@@ -18,29 +256,17 @@ class Config:
     symlink_base_path: str = "/mnt/media"
     
     # 文件模式配置
-    file_patterns: Set[str] = field(default_factory=lambda: {
-        "*.mp4",   # 视频文件
-        "*.mkv",
-        "*.avi",
-        "*.m4v",
-        "*.srt",   # 字幕文件
-        "*.ass",
-        "*.ssa"
-    })
+    file_patterns: FrozenSet[str] = _DEFAULT_FILE_PATTERNS
     
     # 排除模式配置
-    exclude_patterns: List[str] = field(default_factory=lambda: [
-        "**/BDMV/**",          # 蓝光目录
-        "**/CERTIFICATE/**",    # 证书目录
-        "**/@eaDir/**",        # Synology缩略图目录
-        "**/lost+found/**"     # 系统恢复目录
-    ])
+    exclude_patterns: FrozenSet[str] = _DEFAULT_EXCLUDE_PATTERNS
     
     # 挂载点配置
     mount_points: List[str] = field(default_factory=list)  # 挂载点列表
     mount_check_interval: int = 60  # 挂载点状态检查间隔（秒）
     mount_retry_count: int = 3      # 挂载点状态检查重试次数
     mount_retry_delay: int = 5      # 挂载点状态检查重试间隔（秒）
+    mount_status_ttl: int = 2       # 挂载点状态检查结果的缓存时间（秒），0表示不缓存
     
     # 监控目录配置
     monitor_paths: List[str] = field(default_factory=list)  # 监控目录列表
@@ -50,6 +276,7 @@ class Config:
     gdrive_root_path: str = ""  # Google Drive根路径
     local_root_path: str = ""   # 本地挂载路径
     gdrive_polling_interval: int = 3600  # Google Drive查询间隔(秒)
+    gdrive_max_polling_interval: int = 7200  # 连续无变化时查询间隔的上限(秒)，不大于查询间隔时不延长
     gdrive_query_buffer_time: int = 300  # Google Drive查询缓冲时间(秒)
     gdrive_token: Optional[Dict[str, Any]] = None  # Google Drive访问令牌
     gdrive_client_id: Optional[str] = None  # 客户端ID
@@ -57,6 +284,7 @@ class Config:
     gdrive_root_folder_id: Optional[str] = None  # 根文件夹ID
     gdrive_team_drive_id: Optional[str] = None  # 团队云端硬盘ID
     gdrive_scope: str = "https://www.googleapis.com/auth/drive.readonly"  # API权限范围
+    gdrive_debounce_ms: int = 2000  # 变化通知合并窗口（毫秒），窗口内重复变化只通知一次
     
     # Emby配置
     emby_host: str = "http://localhost:8096"
@@ -64,26 +292,44 @@ class Config:
     
     # 本地监控配置
     local_polling_interval: int = 300  # 本地文件轮询间隔（秒）
+    local_debounce_ms: int = 200  # 文件创建/修改事件合并窗口（毫秒），窗口内重复事件只处理一次，0表示不合并
+    ignore_globs: FrozenSet[str] = _DEFAULT_IGNORE_GLOBS  # 本地监控忽略的文件/目录名模式（按名称匹配，匹配的目录整个跳过）
+    xattr_cache_enabled: bool = False  # 是否在文件扩展属性中缓存已记录的修改时间（需文件系统支持xattr）
     
     # 性能配置
     thread_pool_size: int = 8  # 线程池大小，默认为8个线程
     batch_size: int = 100  # 批处理文件数量
     progress_interval: int = 10  # 进度日志更新间隔（秒）
     
+    # 内部状态（由 __post_init__ 计算，不参与初始化、比较和保存）
+    _dirs_ready: bool = field(default=False, init=False, repr=False, compare=False)
+    _mount_prefixes: Tuple[str, ...] = field(default=(), init=False, repr=False, compare=False)
+    _mount_lookup: Tuple[Tuple[str, str], ...] = field(default=(), init=False, repr=False, compare=False)
+    _include_re: Optional['re.Pattern'] = field(default=None, init=False, repr=False, compare=False)
+    _exclude_re: Optional['re.Pattern'] = field(default=None, init=False, repr=False, compare=False)
+    _ignore_re: Optional['re.Pattern'] = field(default=None, init=False, repr=False, compare=False)
+    _exclude_literals: Tuple[str, ...] = field(default=(), init=False, repr=False, compare=False)
+    _exclude_exact: bool = field(default=False, init=False, repr=False, compare=False)
+    _include_exts: Optional[FrozenSet[str]] = field(default=None, init=False, repr=False, compare=False)
+    
     def __post_init__(self):
         """初始化后处理"""
         # 确保路径是绝对路径
         self.db_path = os.path.abspath(self.db_path)
         self.symlink_base_path = os.path.abspath(self.symlink_base_path)
         
-        # 确保必要的目录存在
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        os.makedirs(self.symlink_base_path, exist_ok=True)
+        # 必要的目录在首次使用时由 ensure_dirs() 创建
+        self._dirs_ready = False
         
         # 验证挂载点配置
         if not self.mount_points:
             raise ValueError("至少需要配置一个挂载点")
         
+        # 模式集合统一转换为不可变集合
+        self.file_patterns = frozenset(self.file_patterns)
+        self.exclude_patterns = frozenset(self.exclude_patterns)
+        self.ignore_globs = frozenset(self.ignore_globs)
+        
         # 确保挂载点路径是绝对路径
         self.mount_points = [os.path.abspath(p) for p in self.mount_points]
         
@@ -94,9 +340,16 @@ class Config:
         # 确保监控目录是绝对路径
         self.monitor_paths = [os.path.abspath(p) for p in self.monitor_paths]
         
-        # 验证监控目录是否在挂载点下
+        # 验证监控目录是否在挂载点下（统一以分隔符结尾，避免 /mnt/gdrive2 误匹配 /mnt/gdrive）
+        self._mount_prefixes = tuple(
+            mp if mp.endswith(os.sep) else mp + os.sep for mp in self.mount_points
+        )
+        # (前缀, 挂载点) 按前缀长度降序排列，嵌套挂载点时先匹配最深的一个
+        self._mount_lookup = tuple(sorted(
+            zip(self._mount_prefixes, self.mount_points), key=lambda item: len(item[0]), reverse=True
+        ))
         for monitor_path in self.monitor_paths:
-            if not any(monitor_path.startswith(mount_point) for mount_point in self.mount_points):
+            if not self.under_mount(monitor_path.rstrip(os.sep) + os.sep):
                 raise ValueError(f"监控目录必须在挂载点下: {monitor_path}")
         
         # 验证挂载点状态检查参数
@@ -106,6 +359,10 @@ class Config:
             raise ValueError("挂载点状态检查重试次数必须大于等于0")
         if self.mount_retry_delay < 1:
             raise ValueError("挂载点状态检查重试间隔必须大于0秒")
+        if self.mount_status_ttl < 0:
+            raise ValueError("挂载点状态缓存时间必须大于等于0秒")
+        if self.local_debounce_ms < 0:
+            raise ValueError("本地文件事件合并窗口不能为负数")
         
         # 验证性能配置
         if not isinstance(self.thread_pool_size, int):
@@ -128,6 +385,130 @@ class Config:
             raise ValueError("进度日志更新间隔必须大于0秒")
         if self.progress_interval > 60:
             logger.warning("进度日志更新间隔过长可能影响用户体验")
+        
+        # 预编译文件模式和排除模式（文件扩展名不区分大小写）
+        self._include_re = _compile_globs(self.file_patterns, re.IGNORECASE)
+        self._exclude_re = _compile_globs(self.exclude_patterns)
+        self._ignore_re = _compile_globs(self.ignore_globs)
+        
+        # 预过滤：大部分路径只需子串和扩展名判断，不必执行正则匹配
+        self._exclude_literals, self._exclude_exact = _extract_exclude_literals(self.exclude_patterns)
+        self._include_exts = _extract_include_exts(self.file_patterns)
+    
+    def ensure_dirs(self) -> None:
+        """确保数据库目录和软链接基础目录存在（只在首次调用时创建）"""
+        if self._dirs_ready:
+            return
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        os.makedirs(self.symlink_base_path, exist_ok=True)
+        self._dirs_ready = True
+    
+    def under_mount(self, path: str) -> bool:
+        """
+        判断路径是否位于某个挂载点之下
+        
+        Args:
+            path: 绝对路径
+            
+        Returns:
+            bool: 是否位于挂载点之下
+        """
+        return path.startswith(self._mount_prefixes)
+    
+    def find_mount_point(self, path: str) -> Optional[str]:
+        """
+        查找路径所在的挂载点（嵌套时返回最深的挂载点）
+        
+        Args:
+            path: 绝对路径
+            
+        Returns:
+            Optional[str]: 挂载点路径，不在任何挂载点下时返回None
+        """
+        for prefix, mount_point in self._mount_lookup:
+            if path.startswith(prefix) or path == mount_point:
+                return mount_point
+        return None
+    
+    @property
+    def include_regex(self) -> 're.Pattern':
+        """文件模式对应的预编译正则表达式"""
+        return self._include_re
+    
+    @property
+    def exclude_regex(self) -> 're.Pattern':
+        """排除模式对应的预编译正则表达式"""
+        return self._exclude_re
+    
+    def match_include(self, path: str) -> bool:
+        """
+        判断路径是否匹配文件模式
+        
+        Args:
+            path: 文件路径
+            
+        Returns:
+            bool: 是否匹配
+        """
+        if self._include_exts is not None:
+            return os.path.splitext(path)[1].lower() in self._include_exts
+        return self._include_re.match(path) is not None
+    
+    def match_exclude(self, path: str) -> bool:
+        """
+        判断路径是否匹配排除模式
+        
+        Args:
+            path: 文件路径
+            
+        Returns:
+            bool: 是否匹配
+        """
+        if self._exclude_exact:
+            return any(literal in path for literal in self._exclude_literals)
+        return self._exclude_re.match(path) is not None
+    
+    def match_ignore(self, name: str) -> bool:
+        """
+        判断文件名或目录名是否匹配忽略模式
+        
+        Args:
+            name: 文件名或目录名（不含路径）
+            
+        Returns:
+            bool: 是否忽略
+        """
+        return self._ignore_re.match(name) is not None
+    
+    def fast_reject(self, path: str) -> bool:
+        """
+        快速判断路径是否一定不需要处理（只做子串和扩展名判断）
+        
+        Args:
+            path: 文件路径
+            
+        Returns:
+            bool: 为True时路径一定不需要处理；为False时仍需完整匹配
+        """
+        if any(literal in path for literal in self._exclude_literals):
+            return True
+        if self._include_exts is not None:
+            return os.path.splitext(path)[1].lower() not in self._include_exts
+        return False
+    
+    def match_file(self, path: str) -> bool:
+        """
+        判断路径是否需要处理（匹配文件模式且不匹配排除模式）
+        
+        Args:
+            path: 文件路径
+            
+        Returns:
+            bool: 是否需要处理
+        """
+        if self.fast_reject(path):
+            return False
+        return self.match_include(path) and not self.match_exclude(path)
     
     def validate(self) -> bool:
         """
@@ -159,6 +540,8 @@ class Config:
                     raise ValueError("本地挂载路径必须是绝对路径")
                 if self.gdrive_polling_interval < 30:
                     logger.warning("Google Drive 轮询间隔过短，建议设置为 30 秒以上")
+                if self.gdrive_debounce_ms < 0:
+                    raise ValueError("Google Drive 变化通知合并窗口不能为负数")
                 if not self.gdrive_client_id or not self.gdrive_client_secret:
                     raise ValueError("启用Google Drive监控需要配置client_id和client_secret")
             
@@ -170,36 +553,172 @@ class Config:
 
     @classmethod
     def load_from_yaml(cls, config_path: str) -> 'Config':
-        """从YAML文件加载配置"""
+        """从YAML文件加载配置（配置文件未变化时直接读取解析缓存）"""
+        if config_path.endswith('.json'):
+            return cls.load_from_json(config_path)
+        
         if not os.path.exists(config_path):
             raise FileNotFoundError(f"配置文件不存在: {config_path}")
-            
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config_data = yaml.safe_load(f)
         
-        # 处理集合类型
-        if 'file_patterns' in config_data:
-            config_data['file_patterns'] = set(config_data['file_patterns'])
-        if 'exclude_patterns' in config_data:
-            config_data['exclude_patterns'] = list(config_data['exclude_patterns'])
+        # 使用修改时间和文件大小判断缓存是否有效
+        st = os.stat(config_path)
+        cache_key = (st.st_mtime_ns, st.st_size)
+        
+        # 进程内缓存命中时（如重复加载未修改的配置）只需一次stat
+        memory_key = os.path.abspath(config_path)
+        cached = _CONFIG_CACHE.get(memory_key)
+        if cached and cached[0] == cache_key:
+            return copy.deepcopy(cached[1])
+        
+        config_data = _load_yaml_data(config_path, cache_key)
+        config = cls._from_dict(config_data)
+        _CONFIG_CACHE[memory_key] = (cache_key, copy.deepcopy(config))
+        return config
+    
+    @classmethod
+    def load_from_json(cls, config_path: str) -> 'Config':
+        """从JSON文件加载配置"""
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"配置文件不存在: {config_path}")
+        
+        with open(config_path, 'rb') as f:
+            config_data = json_utils.loads(f.read())
+        return cls._from_dict(config_data)
+    
+    @classmethod
+    def _from_dict(cls, config_data: Dict[str, Any]) -> 'Config':
+        """
+        使用配置数据创建实例（集合类型由 __post_init__ 统一转换）
+        
+        Args:
+            config_data: 配置数据
             
-        # 直接使用配置数据创建实例
-        return cls(**config_data)
+        Returns:
+            Config: 配置实例
+        """
+        # 只使用已定义的配置项创建实例，忽略未知配置项
+        known = {f.name for f in fields(cls) if f.init}
+        unknown = config_data.keys() - known
+        if unknown:
+            logger.warning(f"忽略未知的配置项: {', '.join(sorted(unknown))}")
+        return cls(**{k: v for k, v in config_data.items() if k in known})
 
-    def save_to_yaml(self, config_path: str) -> None:
-        """保存配置到YAML文件"""
-        # 转换为可序列化的格式
+    @classmethod
+    def compile_to_module(cls, config_path: str) -> str:
+        """
+        将YAML配置文件生成为Python模块，之后加载配置时无需再解析YAML
+        
+        配置文件修改后生成的模块自动失效（按修改时间和文件大小判断），需要重新生成。
+        
+        Args:
+            config_path: 配置文件路径
+            
+        Returns:
+            str: 生成的模块路径
+        """
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"配置文件不存在: {config_path}")
+        
+        st = os.stat(config_path)
+        config_data = _load_yaml_data(config_path, (st.st_mtime_ns, st.st_size))
+        
+        # 先用生成的数据构建一次配置，确保配置有效
+        cls._from_dict(config_data)
+        
+        module_path = _generated_config_path(config_path)
+        tmp_path = f"{module_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("# 由 Config.compile_to_module 自动生成，请勿手动修改\n")
+            f.write("import datetime\n\n")
+            f.write(f"__source_path__ = {os.path.abspath(config_path)!r}\n")
+            f.write(f"__source_mtime__ = {st.st_mtime_ns!r}\n")
+            f.write(f"__source_size__ = {st.st_size!r}\n\n")
+            f.write(f"CONFIG = {pprint.pformat(config_data)}\n")
+        os.replace(tmp_path, module_path)
+        
+        logger.info(f"已生成配置模块: {module_path}")
+        return module_path
+    
+    @classmethod
+    def load_header(cls, config_path: str, keys: Set[str]) -> Dict[str, Any]:
+        """
+        只读取配置文件开头部分获取指定配置项（未经过__post_init__处理的原始值）
+        
+        Args:
+            config_path: 配置文件路径
+            keys: 需要读取的配置项名称
+            
+        Returns:
+            Dict[str, Any]: 配置项名称到原始值的映射，配置文件中不存在的项不包含在结果中
+        """
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"配置文件不存在: {config_path}")
+        
+        with open(config_path, 'rb') as f:
+            head = f.read(CONFIG_HEADER_SIZE + 1)
+        
+        try:
+            truncated = len(head) > CONFIG_HEADER_SIZE
+            if truncated:
+                # 只保留完整的行，避免截断多字节字符
+                head = head[:head.rfind(b'\n', 0, CONFIG_HEADER_SIZE) + 1]
+            yaml = _get_yaml()
+            header_data = yaml.load(head.decode('utf-8'), Loader=_yaml_loader(yaml)) or {}
+            if truncated and header_data:
+                # 最后一个配置项可能被截断（如列表只读到一半），丢弃
+                header_data.popitem()
+            if keys.issubset(header_data):
+                return {key: header_data[key] for key in keys}
+        except Exception as e:
+            logger.debug(f"读取配置文件开头失败，改为读取完整配置 {config_path}: {e}")
+        
+        # 开头部分不包含全部配置项时读取完整配置
+        st = os.stat(config_path)
+        config_data = _load_yaml_data(config_path, (st.st_mtime_ns, st.st_size))
+        return {key: config_data[key] for key in keys if key in config_data}
+    
+    def _to_dict(self) -> Dict[str, Any]:
+        """
+        转换为可序列化的配置数据（集合转换为排序后的列表）
+        
+        Returns:
+            Dict[str, Any]: 配置数据
+        """
         config_data = {}
-        for key, value in self.__dict__.items():
+        for f in fields(self):
+            key = f.name
             if key.startswith('_'):
                 continue
-                
-            if isinstance(value, set):
-                value = list(value)
+            
+            value = getattr(self, key)
+            if isinstance(value, (set, frozenset)):
+                value = sorted(value)
             config_data[key] = value
+        return config_data
+    
+    def save_to_json(self, config_path: str) -> None:
+        """保存配置到JSON文件（先写临时文件再替换，避免中断时损坏配置）"""
+        tmp_path = f"{config_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(json_utils.dumps(self._to_dict(), indent=True))
+        os.replace(tmp_path, config_path)
+    
+    def save_to_yaml(self, config_path: str) -> None:
+        """保存配置到YAML文件（文件名以.json结尾时保存为JSON）"""
+        if config_path.endswith('.json'):
+            self.save_to_json(config_path)
+            return
+        
+        # 转换为可序列化的格式
+        config_data = self._to_dict()
         
-        with open(config_path, 'w', encoding='utf-8') as f:
-            yaml.dump(config_data, f, allow_unicode=True, default_flow_style=False)
+        yaml = _get_yaml()
+        dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+        # 先写临时文件再替换，避免中断时损坏配置（其中包含刷新后的令牌）
+        tmp_path = f"{config_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            yaml.dump(config_data, f, Dumper=dumper, allow_unicode=True, default_flow_style=False)
+        os.replace(tmp_path, config_path)
 
 # 创建默认配置实例
 # config = Config() 
@@ -1,9 +1,189 @@
 import sqlite3
 import os
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, Iterator, Iterable, Union
 from utils.logging_utils import logger
+from utils.cache_utils import LRUCache
 import threading
+import queue
+import time
+
+# 数据库结构版本（记录在 PRAGMA user_version 中）
+SCHEMA_VERSION = 5
+
+# 清理时并行读取目录的线程数
+CLEANUP_STAT_WORKERS = 64
+
+# 只读连接池大小
+READ_POOL_SIZE = 4
+
+# 文件/软链接信息缓存的最大条目数
+INFO_CACHE_SIZE = 8192
+
+# 批量写入文件记录时每条语句包含的行数（6个参数/行，低于SQLite默认的999个参数上限）
+MULTI_ROW_INSERT_SIZE = 100
+
+# 批量写入累计超过该行数后执行 ANALYZE
+ANALYZE_THRESHOLD = 10000
+
+# IN查询单条语句的最大参数数（低于旧版SQLite的999个变量限制）
+IN_QUERY_SIZE = 500
+
+# 缓存未命中标记（区分未缓存与缓存值为None）
+_MISSING = object()
+
+# 流式读取时每批获取的行数
+FETCH_BATCH_SIZE = 1000
+
+# 预定义的SQL语句（相同的SQL文本可命中连接的语句缓存，避免重复解析）
+SQL_UPSERT_SCAN_STATUS = """
+    INSERT INTO scan_status (path, status, error, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET
+        status = ?,
+        error = ?,
+        updated_at = ?
+"""
+SQL_GET_SCAN_STATUS = """
+    SELECT path, status, error, start_time, end_time, created_at, updated_at
+    FROM scan_status
+    WHERE path = ?
+"""
+SQL_GET_INCOMPLETE_SCANS = """
+    SELECT path, status, error, start_time, end_time, created_at, updated_at
+    FROM scan_status
+    WHERE status IN ('pending', 'scanning', 'failed')
+"""
+SQL_INSERT_FILE_PREFIX = """
+    INSERT INTO files
+    (path, size, modified_time, hash, created_at, updated_at)
+    VALUES """
+SQL_FILE_ROW_PLACEHOLDER = "(?, ?, ?, ?, ?, ?)"
+SQL_FILE_ON_CONFLICT = """
+    ON CONFLICT(path) DO UPDATE SET
+        size = excluded.size,
+        modified_time = excluded.modified_time,
+        hash = excluded.hash,
+        updated_at = excluded.updated_at
+"""
+SQL_UPSERT_FILE = SQL_INSERT_FILE_PREFIX + SQL_FILE_ROW_PLACEHOLDER + SQL_FILE_ON_CONFLICT
+SQL_UPSERT_SYMLINK = """
+    INSERT INTO symlinks (source_path, link_path, created_at)
+    VALUES (?, ?, ?)
+    ON CONFLICT(link_path) DO UPDATE SET
+        source_path = excluded.source_path
+"""
+SQL_GET_FILE = """
+    SELECT path, size, modified_time, hash, created_at, updated_at
+    FROM files WHERE path = ?
+"""
+SQL_GET_FILES = "SELECT path, size, modified_time FROM files WHERE path IN ({placeholders})"
+SQL_GET_SYMLINK = """
+    SELECT source_path, link_path, created_at
+    FROM symlinks WHERE link_path = ?
+"""
+SQL_LIST_MODIFIED_FILES = """
+    SELECT path, size, modified_time, hash, created_at, updated_at
+    FROM files WHERE modified_time > ?
+"""
+SQL_DELETE_FILE = "DELETE FROM files WHERE path = ?"
+SQL_DELETE_SYMLINK = "DELETE FROM symlinks WHERE link_path = ?"
+SQL_LIST_FILE_PATHS = "SELECT path FROM files"
+SQL_LIST_LINK_PATHS = "SELECT link_path FROM symlinks"
+SQL_LIST_ALL_FILES = """
+    SELECT path, size, modified_time
+    FROM files
+    ORDER BY path
+"""
+# 按主键范围查询目录下的文件：'/' 的下一个字符是 '0'
+SQL_LIST_FILES_UNDER = """
+    SELECT path, size, modified_time
+    FROM files
+    WHERE path >= ? AND path < ?
+    ORDER BY path
+"""
+SQL_LIST_MTIMES_UNDER = """
+    SELECT path, modified_time
+    FROM files
+    WHERE path >= ? AND path < ?
+"""
+SQL_GET_SYMLINKS_BY_SOURCE = "SELECT link_path FROM symlinks WHERE source_path = ?"
+SQL_UPSERT_SCAN_TIME = """
+    INSERT INTO scan_times (path, last_scan_time, created_at, updated_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET
+        last_scan_time = ?,
+        updated_at = ?
+"""
+SQL_GET_LAST_SCAN_TIME = """
+    SELECT last_scan_time
+    FROM scan_times
+    WHERE path = ?
+"""
+SQL_GET_DRIVE_FILE = "SELECT path, mtime FROM drive_files WHERE file_id = ?"
+SQL_GET_DRIVE_FILES = "SELECT file_id, path, mtime FROM drive_files WHERE file_id IN ({placeholders})"
+SQL_UPSERT_DRIVE_FILE = """
+    INSERT INTO drive_files (file_id, path, mtime)
+    VALUES (?, ?, ?)
+    ON CONFLICT(file_id) DO UPDATE SET
+        path = excluded.path,
+        mtime = excluded.mtime
+"""
+SQL_DELETE_DRIVE_FILE = "DELETE FROM drive_files WHERE file_id = ?"
+SQL_MOVE_DRIVE_PATHS = """
+    UPDATE drive_files
+    SET path = ? || substr(path, ?)
+    WHERE path >= ? AND path < ?
+"""
+# 文件表的内容指纹：任何新增、修改、删除都会改变其中至少一项
+SQL_FILES_FINGERPRINT = """
+    SELECT COUNT(*), TOTAL(size), TOTAL(modified_time), MAX(updated_at)
+    FROM files
+"""
+SQL_GET_SYNC_STATE = "SELECT value FROM sync_state WHERE key = ?"
+SQL_UPSERT_SYNC_STATE = """
+    INSERT INTO sync_state (key, value)
+    VALUES (?, ?)
+    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+"""
+SQL_GET_ALL_FILES = """
+    SELECT path, size, modified_time, hash, created_at, updated_at
+    FROM files
+    ORDER BY path
+"""
+
+@functools.lru_cache(maxsize=None)
+def _multi_row_upsert_file_sql(rows: int) -> str:
+    """
+    生成一次写入多行的文件记录SQL（按行数缓存，相同行数复用同一条语句）
+    
+    Args:
+        rows: 每条语句写入的行数
+        
+    Returns:
+        str: SQL语句
+    """
+    return SQL_INSERT_FILE_PREFIX + ", ".join([SQL_FILE_ROW_PLACEHOLDER] * rows) + SQL_FILE_ON_CONFLICT
+
+def _iso_to_epoch(value: Any) -> int:
+    """
+    将ISO格式的时间字符串转换为Unix时间戳（用于版本2迁移）
+    
+    Args:
+        value: ISO格式时间字符串或数值
+        
+    Returns:
+        int: Unix时间戳，无法解析时返回0
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return 0
 
 class DatabaseManager:
     def __init__(self, db_path: str):
@@ -14,79 +194,406 @@ class DatabaseManager:
             db_path: 数据库文件路径
         """
         self.db_path = db_path
-        self._connection_lock = threading.Lock()  # 添加数据库连接锁
+        self._write_conn: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.RLock()  # 写操作锁（所有写入共享同一个连接）
+        self._transaction_depth = 0  # 当前写事务的嵌套层数
+        self._transaction_failed = False  # 外层事务中是否有写操作失败
+        self._read_pool: queue.Queue = queue.Queue(maxsize=READ_POOL_SIZE)
+        
+        # 热点查询缓存（写入提交后失效），失效计数用于避免把并发写入前读到的旧值放回缓存
+        self._file_cache = LRUCache(INFO_CACHE_SIZE)
+        self._symlink_cache = LRUCache(INFO_CACHE_SIZE)
+        self._cache_generation = 0
+        self._cache_lock = threading.Lock()  # 保证失效计数与缓存的增删在同一临界区内完成
+        self._rows_since_analyze = 0  # 上次 ANALYZE 后批量写入的行数
         self._init_db()
+        
+        # 预先打开只读连接，WAL模式下读操作不会被写事务阻塞
+        for _ in range(READ_POOL_SIZE):
+            self._read_pool.put_nowait(self._open_connection(read_only=True))
     
-    def _get_connection(self):
+    def _open_connection(self, read_only: bool = False) -> sqlite3.Connection:
         """
-        获取数据库连接
+        打开并配置一个数据库连接
         
+        Args:
+            read_only: 是否为只读连接
+            
         Returns:
             sqlite3.Connection: 数据库连接对象
         """
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0)  # 增加超时时间
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=30.0,  # 增加超时时间
+                check_same_thread=False,
+                isolation_level=None,  # 自动提交，事务由 _write_transaction 显式控制
+                cached_statements=256
+            )
             conn.row_factory = sqlite3.Row  # 使用字典形式返回结果
+            
+            # 连接级参数只需设置一次
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA analysis_limit=1000")  # 限制 ANALYZE/optimize 的采样开销
+            if read_only:
+                conn.execute("PRAGMA query_only=1")
             return conn
         except sqlite3.Error as e:
             logger.error(f"连接数据库失败: {e}")
             raise
     
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        获取写连接（首次调用时创建，之后复用同一个连接）
+        
+        Returns:
+            sqlite3.Connection: 数据库连接对象
+        """
+        if self._write_conn is not None:
+            return self._write_conn
+        
+        with self._write_lock:
+            if self._write_conn is None:
+                self._write_conn = self._open_connection()
+            return self._write_conn
+    
+    @contextmanager
+    def _read_connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        从连接池借出一个只读连接，用完后归还
+        
+        Returns:
+            Iterator[sqlite3.Connection]: 只读数据库连接
+        """
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            # 连接池已借空（如嵌套读取），临时打开一个连接
+            conn = self._open_connection(read_only=True)
+        
+        try:
+            yield conn
+        finally:
+            try:
+                self._read_pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    @contextmanager
+    def _write_transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        在写锁保护下执行事务，异常时回滚
+        
+        嵌套调用并入外层事务；内层写操作失败时（即使调用方捕获了异常）外层事务整体回滚，
+        并在退出时抛出 sqlite3.Error，避免只提交部分写入
+        
+        Returns:
+            Iterator[sqlite3.Connection]: 数据库连接对象
+        """
+        with self._write_lock:
+            conn = self._get_connection()
+            if self._transaction_depth:
+                # 嵌套调用时并入外层事务
+                self._transaction_depth += 1
+                try:
+                    yield conn
+                except sqlite3.Error:
+                    self._transaction_failed = True
+                    raise
+                finally:
+                    self._transaction_depth -= 1
+                return
+            
+            # 开始时即获取写锁：事务内先读后写时，延迟升级写锁遇到其他进程写入会直接失败而不等待超时
+            conn.execute("BEGIN IMMEDIATE")
+            self._transaction_depth = 1
+            self._transaction_failed = False
+            try:
+                yield conn
+                if self._transaction_failed:
+                    raise sqlite3.OperationalError("事务中的写操作失败，整个事务已回滚")
+            except BaseException:
+                # 部分错误（如磁盘已满）会由SQLite自动回滚
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._transaction_depth = 0
+            conn.execute("COMMIT")
+    
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        将多次写操作合并到同一个事务中，只提交一次
+        
+        事务内各写操作的缓存失效发生在实际提交之前，提交后再清空热点缓存，
+        避免并发读取把提交前的旧值放回缓存
+        
+        Returns:
+            Iterator[None]: 上下文管理器
+        """
+        with self._write_transaction():
+            yield
+        self._clear_caches(self._file_cache, self._symlink_cache)
+    
+    def close(self) -> None:
+        """关闭所有数据库连接"""
+        with self._write_lock:
+            if self._write_conn is not None:
+                try:
+                    # 关闭前让SQLite按需更新统计信息
+                    self._write_conn.execute("PRAGMA optimize")
+                    self._write_conn.close()
+                except sqlite3.Error as e:
+                    logger.error(f"关闭数据库连接失败: {e}")
+                finally:
+                    self._write_conn = None
+        
+        while True:
+            try:
+                conn = self._read_pool.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"关闭数据库连接失败: {e}")
+    
+    def _after_bulk_write(self, count: int) -> None:
+        """
+        记录批量写入的行数，累计超过阈值时更新查询优化器的统计信息
+        
+        Args:
+            count: 本次写入的行数
+        """
+        with self._write_lock:
+            self._rows_since_analyze += count
+            if self._rows_since_analyze < ANALYZE_THRESHOLD:
+                return
+            self._rows_since_analyze = 0
+            try:
+                self._get_connection().execute("ANALYZE")
+                logger.debug("已更新数据库统计信息")
+            except sqlite3.Error as e:
+                logger.error(f"更新数据库统计信息失败: {e}")
+    
+    def _invalidate_cache(self, cache: LRUCache, keys: Iterable[str]) -> None:
+        """
+        使缓存条目失效（在写事务提交后调用）
+        
+        Args:
+            cache: 缓存对象
+            keys: 需要失效的路径
+        """
+        with self._cache_lock:
+            self._cache_generation += 1
+            for key in keys:
+                cache.pop(key, None)
+    
+    def _clear_caches(self, *caches: LRUCache) -> None:
+        """
+        清空缓存（在写事务提交后调用）
+        
+        Args:
+            caches: 需要清空的缓存对象
+        """
+        with self._cache_lock:
+            self._cache_generation += 1
+            for cache in caches:
+                cache.clear()
+    
+    def _cache_put(self, cache: LRUCache, key: str, value: Any, generation: int) -> None:
+        """
+        写入查询结果，查询期间缓存已失效时放弃（避免把提交前读到的旧值放回缓存）
+        
+        Args:
+            cache: 缓存对象
+            key: 缓存键
+            value: 查询结果
+            generation: 查询前读取的失效计数
+        """
+        with self._cache_lock:
+            if generation == self._cache_generation:
+                cache.put(key, value)
+    
     def _init_db(self) -> None:
-        """初始化数据库"""
-        with self._get_connection() as conn:
+        """初始化数据库（根据 user_version 只执行尚未应用的迁移）"""
+        conn = self._get_connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        
+        with self._write_transaction() as conn:
             cursor = conn.cursor()
-            
-            # 创建文件表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS files (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    path TEXT UNIQUE NOT NULL,
-                    size INTEGER NOT NULL,
-                    modified_time TEXT NOT NULL,
-                    hash TEXT,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL
-                )
-            """)
-            
-            # 创建软链接表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS symlinks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    source_path TEXT NOT NULL,
-                    link_path TEXT UNIQUE NOT NULL,
-                    created_at TEXT NOT NULL
-                )
-            """)
-            
-            # 创建扫描状态表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS scan_status (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    path TEXT UNIQUE NOT NULL,
-                    status TEXT NOT NULL,  -- 'pending', 'scanning', 'completed', 'failed'
-                    start_time TEXT,
-                    end_time TEXT,
-                    error TEXT,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL
-                )
-            """)
-            
-            # 创建扫描时间记录表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS scan_times (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    path TEXT UNIQUE NOT NULL,
-                    last_scan_time TEXT NOT NULL,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL
-                )
-            """)
-            
-            conn.commit()
-            logger.info("数据库初始化成功")
+            if version < 1:
+                self._migrate_v1(cursor)
+            if version < 2:
+                self._migrate_v2(cursor)
+            if version < 3:
+                self._migrate_v3(cursor)
+            if version < 4:
+                self._migrate_v4(cursor)
+            if version < 5:
+                self._migrate_v5(cursor)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        
+        logger.info(f"数据库初始化成功，结构版本: {version} -> {SCHEMA_VERSION}")
+    
+    def _migrate_v1(self, cursor: sqlite3.Cursor) -> None:
+        """
+        迁移到版本1：创建基础表和索引
+        
+        Args:
+            cursor: 数据库游标
+        """
+        # 创建文件表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                modified_time TEXT NOT NULL,
+                hash TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        
+        # 创建软链接表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS symlinks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source_path TEXT NOT NULL,
+                link_path TEXT UNIQUE NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        
+        # 创建扫描状态表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_status (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                status TEXT NOT NULL,  -- 'pending', 'scanning', 'completed', 'failed'
+                start_time TEXT,
+                end_time TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        
+        # 创建扫描时间记录表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_times (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                last_scan_time TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        
+        # 创建索引
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_symlinks_source ON symlinks(source_path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_status_status ON scan_status(status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_modified ON files(modified_time)")
+    
+    def _migrate_v2(self, cursor: sqlite3.Cursor) -> None:
+        """
+        迁移到版本2：files 表的时间字段改为 INTEGER（Unix时间戳），读取时无需再解析字符串
+        
+        Args:
+            cursor: 数据库游标
+        """
+        cursor.connection.create_function('iso_to_epoch', 1, _iso_to_epoch, deterministic=True)
+        
+        cursor.execute("""
+            CREATE TABLE files_v2 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                modified_time INTEGER NOT NULL,
+                hash TEXT,
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO files_v2 (id, path, size, modified_time, hash, created_at, updated_at)
+            SELECT id, path, size, iso_to_epoch(modified_time), hash,
+                   iso_to_epoch(created_at), iso_to_epoch(updated_at)
+            FROM files
+        """)
+        cursor.execute("DROP TABLE files")
+        cursor.execute("ALTER TABLE files_v2 RENAME TO files")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_modified ON files(modified_time)")
+    
+    def _migrate_v3(self, cursor: sqlite3.Cursor) -> None:
+        """
+        迁移到版本3：symlinks.source_path 引用 files.path，删除文件记录时级联删除软链接记录
+        
+        Args:
+            cursor: 数据库游标
+        """
+        cursor.execute("""
+            CREATE TABLE symlinks_v3 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source_path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+                link_path TEXT UNIQUE NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        
+        # 源文件已不在 files 表中的软链接记录无法满足外键约束，直接丢弃
+        cursor.execute("""
+            INSERT INTO symlinks_v3 (id, source_path, link_path, created_at)
+            SELECT id, source_path, link_path, created_at
+            FROM symlinks
+            WHERE source_path IN (SELECT path FROM files)
+        """)
+        kept = cursor.rowcount
+        dropped = cursor.execute("SELECT COUNT(*) FROM symlinks").fetchone()[0] - kept
+        if dropped:
+            logger.warning(f"丢弃 {dropped} 条源文件不存在的软链接记录")
+        
+        cursor.execute("DROP TABLE symlinks")
+        cursor.execute("ALTER TABLE symlinks_v3 RENAME TO symlinks")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_symlinks_source ON symlinks(source_path)")
+    
+    def _migrate_v4(self, cursor: sqlite3.Cursor) -> None:
+        """
+        迁移到版本4：记录Google Drive文件ID对应的本地路径和修改时间
+        
+        Args:
+            cursor: 数据库游标
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS drive_files (
+                file_id TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                mtime INTEGER NOT NULL
+            )
+        """)
+    
+    def _migrate_v5(self, cursor: sqlite3.Cursor) -> None:
+        """
+        迁移到版本5：保存同步状态（如Google Drive变更列表的页面令牌）
+        
+        Args:
+            cursor: 数据库游标
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
     
     def update_scan_status(self, path: str, status: str, error: str = None) -> None:
         """
@@ -99,19 +606,8 @@ class DatabaseManager:
         """
         now = datetime.now().isoformat()
         
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO scan_status (path, status, error, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(path) DO UPDATE SET
-                    status = ?,
-                    error = ?,
-                    updated_at = ?
-            """, (path, status, error, now, now, status, error, now))
-            
-            conn.commit()
+        with self._write_transaction() as conn:
+            conn.execute(SQL_UPSERT_SCAN_STATUS, (path, status, error, now, now, status, error, now))
     
     def get_scan_status(self, path: str) -> Dict[str, Any]:
         """
@@ -123,45 +619,11 @@ class DatabaseManager:
         Returns:
             Dict[str, Any]: 扫描状态信息
         """
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT path, status, error, start_time, end_time, created_at, updated_at
-                FROM scan_status
-                WHERE path = ?
-            """, (path,))
-            
-            row = cursor.fetchone()
-            if row:
-                return {
-                    'path': row[0],
-                    'status': row[1],
-                    'error': row[2],
-                    'start_time': row[3],
-                    'end_time': row[4],
-                    'created_at': row[5],
-                    'updated_at': row[6]
-                }
-            return None
-    
-    def get_incomplete_scans(self) -> List[Dict[str, Any]]:
-        """
-        获取所有未完成的扫描
+        with self._read_connection() as conn:
+            row = conn.execute(SQL_GET_SCAN_STATUS, (path,)).fetchone()
         
-        Returns:
-            List[Dict[str, Any]]: 未完成的扫描列表
-        """
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT path, status, error, start_time, end_time, created_at, updated_at
-                FROM scan_status
-                WHERE status IN ('pending', 'scanning', 'failed')
-            """)
-            
-            return [{
+        if row:
+            return {
                 'path': row[0],
                 'status': row[1],
                 'error': row[2],
@@ -169,7 +631,28 @@ class DatabaseManager:
                 'end_time': row[4],
                 'created_at': row[5],
                 'updated_at': row[6]
-            } for row in cursor.fetchall()]
+            }
+        return None
+    
+    def get_incomplete_scans(self) -> List[Dict[str, Any]]:
+        """
+        获取所有未完成的扫描
+        
+        Returns:
+            List[Dict[str, Any]]: 未完成的扫描列表
+        """
+        with self._read_connection() as conn:
+            rows = conn.execute(SQL_GET_INCOMPLETE_SCANS).fetchall()
+        
+        return [{
+            'path': row[0],
+            'status': row[1],
+            'error': row[2],
+            'start_time': row[3],
+            'end_time': row[4],
+            'created_at': row[5],
+            'updated_at': row[6]
+        } for row in rows]
     
     def add_file(self, path: str, size: int, modified_time: float, file_hash: Optional[str] = None) -> bool:
         """
@@ -185,18 +668,11 @@ class DatabaseManager:
             bool: 操作是否成功
         """
         try:
-            now = datetime.now().isoformat()
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                # 将时间戳转换为datetime对象
-                dt = datetime.fromtimestamp(modified_time)
-                cursor.execute("""
-                    INSERT OR REPLACE INTO files 
-                    (path, size, modified_time, hash, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (path, size, dt.isoformat(), file_hash, now, now))
-                conn.commit()
-                return True
+            now = int(time.time())
+            with self._write_transaction() as conn:
+                conn.execute(SQL_UPSERT_FILE, (path, size, int(modified_time), file_hash, now, now))
+            self._invalidate_cache(self._file_cache, (path,))
+            return True
         except sqlite3.Error as e:
             logger.error(f"添加文件记录失败 {path}: {e}")
             return False
@@ -213,20 +689,74 @@ class DatabaseManager:
             bool: 操作是否成功
         """
         try:
-            with self._connection_lock:  # 使用连接锁
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    now = datetime.now().isoformat()
-                    cursor.execute('''
-                    INSERT OR REPLACE INTO symlinks (source_path, link_path, created_at)
-                    VALUES (?, ?, ?)
-                    ''', (source_path, link_path, now))
-                    conn.commit()
-                    return True
+            now = datetime.now().isoformat()
+            with self._write_transaction() as conn:
+                conn.execute(SQL_UPSERT_SYMLINK, (source_path, link_path, now))
+            self._invalidate_cache(self._symlink_cache, (link_path,))
+            return True
         except sqlite3.Error as e:
             logger.error(f"添加软链接记录失败 {source_path} -> {link_path}: {e}")
             return False
     
+    def add_files_bulk(self, rows: Iterable[Tuple[str, int, float, Optional[str]]]) -> int:
+        """
+        在单个事务中批量添加或更新文件信息
+        
+        Args:
+            rows: (文件路径, 文件大小, 修改时间（Unix时间戳）, 文件哈希值) 元组序列
+            
+        Returns:
+            int: 写入的记录数，失败时返回0
+        """
+        now = int(time.time())
+        records = [
+            (path, size, int(modified_time), file_hash, now, now)
+            for path, size, modified_time, file_hash in rows
+        ]
+        if not records:
+            return 0
+        
+        try:
+            with self._write_transaction() as conn:
+                # 每条语句写入多行，减少逐行执行语句的开销
+                for start in range(0, len(records), MULTI_ROW_INSERT_SIZE):
+                    chunk = records[start:start + MULTI_ROW_INSERT_SIZE]
+                    conn.execute(
+                        _multi_row_upsert_file_sql(len(chunk)),
+                        [value for record in chunk for value in record]
+                    )
+            self._invalidate_cache(self._file_cache, (record[0] for record in records))
+            self._after_bulk_write(len(records))
+            return len(records)
+        except sqlite3.Error as e:
+            logger.error(f"批量添加文件记录失败（{len(records)} 条）: {e}")
+            return 0
+    
+    def add_symlinks_bulk(self, rows: Iterable[Tuple[str, str]]) -> int:
+        """
+        在单个事务中批量添加软链接映射
+        
+        Args:
+            rows: (源文件路径, 软链接路径) 元组序列
+            
+        Returns:
+            int: 写入的记录数，失败时返回0
+        """
+        now = datetime.now().isoformat()
+        records = [(source_path, link_path, now) for source_path, link_path in rows]
+        if not records:
+            return 0
+        
+        try:
+            with self._write_transaction() as conn:
+                conn.executemany(SQL_UPSERT_SYMLINK, records)
+            self._invalidate_cache(self._symlink_cache, (record[1] for record in records))
+            self._after_bulk_write(len(records))
+            return len(records)
+        except sqlite3.Error as e:
+            logger.error(f"批量添加软链接记录失败（{len(records)} 条）: {e}")
+            return 0
+    
     def get_file_info(self, path: str) -> Optional[Dict]:
         """
         获取文件信息
@@ -237,29 +767,55 @@ class DatabaseManager:
         Returns:
             Dict: 文件信息字典，如果不存在返回None
         """
+        cached = self._file_cache.get(path, _MISSING)
+        if cached is not _MISSING:
+            return dict(cached) if cached else None
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                SELECT path, size, modified_time, hash, created_at, updated_at
-                FROM files WHERE path = ?
-                ''', (path,))
-                row = cursor.fetchone()
-                
-                if row:
-                    return {
-                        'path': row[0],
-                        'size': row[1],
-                        'modified_time': datetime.fromisoformat(row[2]),
-                        'hash': row[3],
-                        'created_at': datetime.fromisoformat(row[4]),
-                        'updated_at': datetime.fromisoformat(row[5])
-                    }
-                return None
+            generation = self._cache_generation
+            with self._read_connection() as conn:
+                row = conn.execute(SQL_GET_FILE, (path,)).fetchone()
+            
+            info = None
+            if row:
+                info = {
+                    'path': row[0],
+                    'size': row[1],
+                    'modified_time': row[2],
+                    'mtime': row[2],  # 为了兼容性添加 mtime 字段
+                    'hash': row[3],
+                    'created_at': row[4],
+                    'updated_at': row[5]
+                }
+            self._cache_put(self._file_cache, path, info, generation)
+            return dict(info) if info else None
         except sqlite3.Error as e:
             logger.error(f"获取文件信息失败 {path}: {e}")
             return None
     
+    def get_file_infos(self, paths: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+        """
+        批量获取文件的大小和修改时间（每条语句查询多个路径）
+        
+        Args:
+            paths: 文件路径序列
+            
+        Returns:
+            Dict[str, Tuple[int, int]]: 文件路径到(文件大小, 修改时间（Unix时间戳）)的映射，未记录的路径不包含在内
+        """
+        paths = list(dict.fromkeys(paths))
+        result = {}
+        try:
+            with self._read_connection() as conn:
+                for start in range(0, len(paths), IN_QUERY_SIZE):
+                    chunk = paths[start:start + IN_QUERY_SIZE]
+                    sql = SQL_GET_FILES.format(placeholders=', '.join('?' * len(chunk)))
+                    for path, size, modified_time in conn.execute(sql, chunk):
+                        result[path] = (size, modified_time)
+        except sqlite3.Error as e:
+            logger.error(f"批量获取文件信息失败（{len(paths)} 条）: {e}")
+        return result
+    
     def get_symlink_info(self, link_path: str) -> Optional[Dict]:
         """
         获取软链接信息
@@ -270,59 +826,64 @@ class DatabaseManager:
         Returns:
             Dict: 软链接信息字典，如果不存在返回None
         """
+        cached = self._symlink_cache.get(link_path, _MISSING)
+        if cached is not _MISSING:
+            return dict(cached) if cached else None
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                SELECT source_path, link_path, created_at
-                FROM symlinks WHERE link_path = ?
-                ''', (link_path,))
-                row = cursor.fetchone()
-                
-                if row:
-                    return {
-                        'source_path': row[0],
-                        'link_path': row[1],
-                        'created_at': datetime.fromisoformat(row[2])
-                    }
-                return None
+            generation = self._cache_generation
+            with self._read_connection() as conn:
+                row = conn.execute(SQL_GET_SYMLINK, (link_path,)).fetchone()
+            
+            info = None
+            if row:
+                info = {
+                    'source_path': row[0],
+                    'link_path': row[1],
+                    'created_at': datetime.fromisoformat(row[2])
+                }
+            self._cache_put(self._symlink_cache, link_path, info, generation)
+            return dict(info) if info else None
         except sqlite3.Error as e:
             logger.error(f"获取软链接信息失败 {link_path}: {e}")
             return None
     
-    def list_modified_files(self, since: datetime) -> List[Dict]:
+    def list_modified_files(self, since: Union[datetime, float], parse_dates: bool = False) -> Iterator[Dict]:
         """
-        获取指定时间后修改的文件列表
+        获取指定时间后修改的文件（按批从数据库读取，逐条返回）
         
         Args:
-            since: 起始时间
+            since: 起始时间（datetime或Unix时间戳）
+            parse_dates: 是否将时间字段转换为datetime对象，默认返回Unix时间戳
             
         Returns:
-            List[Dict]: 文件信息列表
+            Iterator[Dict]: 文件信息迭代器
         """
+        if isinstance(since, datetime):
+            since = since.timestamp()
+        convert = datetime.fromtimestamp if parse_dates else int
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                SELECT path, size, modified_time, hash, created_at, updated_at
-                FROM files WHERE modified_time > ?
-                ''', (since.isoformat(),))
-                
-                return [{
-                    'path': row[0],
-                    'size': row[1],
-                    'modified_time': datetime.fromisoformat(row[2]),
-                    'hash': row[3],
-                    'created_at': datetime.fromisoformat(row[4]),
-                    'updated_at': datetime.fromisoformat(row[5])
-                } for row in cursor.fetchall()]
+            with self._read_connection() as conn:
+                cursor = conn.execute(SQL_LIST_MODIFIED_FILES, (int(since),))
+                while True:
+                    rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield {
+                            'path': row[0],
+                            'size': row[1],
+                            'modified_time': convert(row[2]),
+                            'hash': row[3],
+                            'created_at': convert(row[4]),
+                            'updated_at': convert(row[5])
+                        }
         except sqlite3.Error as e:
             logger.error(f"获取修改文件列表失败: {e}")
-            return []
     
     def remove_file(self, path: str) -> bool:
         """
-        删除文件记录
+        删除文件记录（对应的软链接记录由外键级联删除）
         
         Args:
             path: 文件路径
@@ -331,18 +892,43 @@ class DatabaseManager:
             bool: 是否成功
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "DELETE FROM files WHERE path = ?",
+            with self._write_transaction() as conn:
+                cursor = conn.execute(
+                    SQL_DELETE_FILE,
                     (path,)
                 )
-                return cursor.rowcount > 0
+            self._invalidate_cache(self._file_cache, (path,))
+            self._clear_caches(self._symlink_cache)  # 软链接记录可能已被级联删除
+            return cursor.rowcount > 0
                 
         except Exception as e:
             logger.error(f"删除文件记录失败 {path}: {e}")
             return False
     
+    def remove_files_bulk(self, paths: Iterable[str]) -> int:
+        """
+        在单个事务中批量删除文件记录（对应的软链接记录由外键级联删除）
+        
+        Args:
+            paths: 文件路径序列
+            
+        Returns:
+            int: 删除的记录数，失败时返回0
+        """
+        paths = list(paths)
+        if not paths:
+            return 0
+        
+        try:
+            with self._write_transaction() as conn:
+                cursor = conn.executemany(SQL_DELETE_FILE, ((path,) for path in paths))
+            self._invalidate_cache(self._file_cache, paths)
+            self._clear_caches(self._symlink_cache)  # 软链接记录可能已被级联删除
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"批量删除文件记录失败（{len(paths)} 条）: {e}")
+            return 0
+    
     def remove_symlink(self, link_path: str) -> bool:
         """
         删除软链接记录
@@ -354,15 +940,45 @@ class DatabaseManager:
             bool: 操作是否成功
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM symlinks WHERE link_path = ?', (link_path,))
-                conn.commit()
-                return True
+            with self._write_transaction() as conn:
+                conn.execute(SQL_DELETE_SYMLINK, (link_path,))
+            self._invalidate_cache(self._symlink_cache, (link_path,))
+            return True
         except sqlite3.Error as e:
             logger.error(f"删除软链接记录失败 {link_path}: {e}")
             return False
     
+    @staticmethod
+    def _find_missing_paths(paths: List[str]) -> List[str]:
+        """
+        找出已不存在的路径：按父目录分组，每个目录只读取一次目录项，并行处理各目录
+        
+        Args:
+            paths: 路径列表
+            
+        Returns:
+            List[str]: 不存在的路径列表
+        """
+        by_parent: Dict[str, List[Tuple[str, str]]] = {}
+        for path in paths:
+            parent, name = os.path.split(path)
+            by_parent.setdefault(parent, []).append((name, path))
+        
+        def check_parent(item: Tuple[str, List[Tuple[str, str]]]) -> List[str]:
+            parent, entries = item
+            try:
+                with os.scandir(parent) as it:
+                    existing = {entry.name for entry in it}
+            except FileNotFoundError:
+                return [path for _, path in entries]
+            except OSError:
+                # 无法列出目录内容时逐个检查
+                return [path for _, path in entries if not os.path.lexists(path)]
+            return [path for name, path in entries if name not in existing]
+        
+        with ThreadPoolExecutor(max_workers=CLEANUP_STAT_WORKERS) as executor:
+            return [path for missing in executor.map(check_parent, by_parent.items()) for path in missing]
+    
     def cleanup(self) -> Tuple[int, int]:
         """
         清理不存在的文件和软链接记录
@@ -370,71 +986,135 @@ class DatabaseManager:
         Returns:
             Tuple[int, int]: (清理的文件数, 清理的软链接数)
         """
-        files_cleaned = 0
-        symlinks_cleaned = 0
-        
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # 获取所有文件记录
-                cursor.execute('SELECT path FROM files')
-                for (path,) in cursor.fetchall():
-                    if not os.path.exists(path):
-                        if self.remove_file(path):
-                            files_cleaned += 1
-                
-                # 获取所有软链接记录
-                cursor.execute('SELECT link_path FROM symlinks')
-                for (link_path,) in cursor.fetchall():
-                    if not os.path.exists(link_path):
-                        if self.remove_symlink(link_path):
-                            symlinks_cleaned += 1
-                
-                logger.info(f"清理完成: 删除了 {files_cleaned} 个文件记录和 {symlinks_cleaned} 个软链接记录")
-                return files_cleaned, symlinks_cleaned
+            with self._read_connection() as conn:
+                file_paths = [row[0] for row in conn.execute(SQL_LIST_FILE_PATHS)]
+                link_paths = [row[0] for row in conn.execute(SQL_LIST_LINK_PATHS)]
+            
+            # 检查路径是否存在（IO密集，不占用写锁）
+            missing_files = self._find_missing_paths(file_paths)
+            missing_links = self._find_missing_paths(link_paths)
+            
+            # 在同一个事务中批量删除
+            with self._write_transaction() as conn:
+                conn.executemany(SQL_DELETE_FILE, ((path,) for path in missing_files))
+                conn.executemany(SQL_DELETE_SYMLINK, ((path,) for path in missing_links))
+            self._invalidate_cache(self._file_cache, missing_files)
+            self._invalidate_cache(self._symlink_cache, missing_links)
+            if missing_files:
+                self._clear_caches(self._symlink_cache)  # 软链接记录可能已被级联删除
+            
+            files_cleaned = len(missing_files)
+            symlinks_cleaned = len(missing_links)
+            logger.info(f"清理完成: 删除了 {files_cleaned} 个文件记录和 {symlinks_cleaned} 个软链接记录")
+            return files_cleaned, symlinks_cleaned
                 
         except sqlite3.Error as e:
             logger.error(f"清理数据库失败: {e}")
             return 0, 0
     
-    def list_all_files(self) -> List[Dict[str, Any]]:
+    def list_all_files(self) -> Iterator[Dict[str, Any]]:
         """
-        获取所有文件记录
+        获取所有文件记录（按批从数据库读取，逐条返回）
         
         Returns:
-            List[Dict[str, Any]]: 文件记录列表，每个文件包含:
+            Iterator[Dict[str, Any]]: 文件记录迭代器，每个文件包含:
                 - path: 文件路径
                 - size: 文件大小
                 - modified_time: 修改时间（Unix时间戳）
                 - mtime: modified_time的别名，用于兼容性
         """
         try:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT path, size, modified_time
-                    FROM files
-                    ORDER BY path
-                """)
-                
-                files = []
-                for row in cursor.fetchall():
-                    # 将 ISO 格式的时间字符串转换为时间戳
-                    dt = datetime.fromisoformat(row['modified_time'])
-                    timestamp = dt.timestamp()
-                    files.append({
-                        'path': row['path'],
-                        'size': row['size'],
-                        'modified_time': timestamp,
-                        'mtime': timestamp  # 为了兼容性添加 mtime 字段
-                    })
-                return files
+            with self._read_connection() as conn:
+                cursor = conn.execute(SQL_LIST_ALL_FILES)
+                while True:
+                    rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield {
+                            'path': row[0],
+                            'size': row[1],
+                            'modified_time': row[2],
+                            'mtime': row[2]  # 为了兼容性添加 mtime 字段
+                        }
                 
         except sqlite3.Error as e:
             logger.error(f"获取所有文件记录失败: {e}")
+
+    def iter_files_sorted(self) -> Iterator[Tuple[str, int, int]]:
+        """
+        按路径顺序流式返回所有文件记录（不构造字典）
+        
+        每个目录的整棵子树在结果中是连续的一段；但直接位于某目录下的文件
+        可能被其子目录的记录隔开（如 /d/a.txt、/d/b/x、/d/c.txt）
+
+        Returns:
+            Iterator[Tuple[str, int, int]]: (文件路径, 文件大小, 修改时间（Unix时间戳）) 迭代器
+
+        Raises:
+            sqlite3.Error: 读取失败（调用方据此区分完整遍历与中途中断）
+        """
+        try:
+            with self._read_connection() as conn:
+                cursor = conn.execute(SQL_LIST_ALL_FILES)
+                while True:
+                    rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                    if not rows:
+                        break
+                    yield from rows
+
+        except sqlite3.Error as e:
+            logger.error(f"获取所有文件记录失败: {e}")
+            raise
+
+    def list_files_under(self, directory: str) -> List[Tuple[str, int, int]]:
+        """
+        获取目录下（含子目录）的所有文件记录
+        
+        Args:
+            directory: 目录路径
+            
+        Returns:
+            List[Tuple[str, int, int]]: (文件路径, 文件大小, 修改时间（Unix时间戳）) 列表
+        """
+        prefix = directory.rstrip(os.sep)
+        try:
+            with self._read_connection() as conn:
+                return conn.execute(
+                    SQL_LIST_FILES_UNDER, (prefix + os.sep, prefix + chr(ord(os.sep) + 1))
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"获取目录文件记录失败 {directory}: {e}")
             return []
     
+    def load_mtimes(self, directory: str) -> Dict[str, int]:
+        """
+        一次性载入目录下（含子目录）所有文件的修改时间
+        
+        Args:
+            directory: 目录路径
+            
+        Returns:
+            Dict[str, int]: 文件路径到修改时间（Unix时间戳）的映射
+        """
+        prefix = directory.rstrip(os.sep)
+        try:
+            with self._read_connection() as conn:
+                cursor = conn.execute(
+                    SQL_LIST_MTIMES_UNDER, (prefix + os.sep, prefix + chr(ord(os.sep) + 1))
+                )
+                result = {}
+                while True:
+                    rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                    if not rows:
+                        break
+                    result.update(rows)
+                return result
+        except sqlite3.Error as e:
+            logger.error(f"载入文件修改时间失败 {directory}: {e}")
+            return {}
+    
     def get_symlinks_by_source(self, source_path: str) -> List[str]:
         """
         获取源文件对应的所有软链接
@@ -446,10 +1126,9 @@ class DatabaseManager:
             List[str]: 软链接路径列表
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT link_path FROM symlinks WHERE source_path = ?",
+            with self._read_connection() as conn:
+                cursor = conn.execute(
+                    SQL_GET_SYMLINKS_BY_SOURCE,
                     (source_path,)
                 )
                 return [row[0] for row in cursor.fetchall()]
@@ -467,18 +1146,8 @@ class DatabaseManager:
         """
         now = datetime.now().isoformat()
         
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO scan_times (path, last_scan_time, created_at, updated_at)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(path) DO UPDATE SET
-                    last_scan_time = ?,
-                    updated_at = ?
-            """, (path, now, now, now, now, now))
-            
-            conn.commit()
+        with self._write_transaction() as conn:
+            conn.execute(SQL_UPSERT_SCAN_TIME, (path, now, now, now, now, now))
     
     def get_last_scan_time(self, path: str) -> Optional[datetime]:
         """
@@ -490,19 +1159,12 @@ class DatabaseManager:
         Returns:
             Optional[datetime]: 最后扫描时间，如果不存在则返回None
         """
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT last_scan_time
-                FROM scan_times
-                WHERE path = ?
-            """, (path,))
-            
-            row = cursor.fetchone()
-            if row and row[0]:
-                return datetime.fromisoformat(row[0])
-            return None
+        with self._read_connection() as conn:
+            row = conn.execute(SQL_GET_LAST_SCAN_TIME, (path,)).fetchone()
+        
+        if row and row[0]:
+            return datetime.fromisoformat(row[0])
+        return None
     
     def get_all_files(self) -> List[Dict[str, Any]]:
         """
@@ -511,20 +1173,214 @@ class DatabaseManager:
         Returns:
             List[Dict[str, Any]]: 文件记录列表，每个记录包含 path, size, modified_time 等信息
         """
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+        with self._read_connection() as conn:
+            rows = conn.execute(SQL_GET_ALL_FILES).fetchall()
+        
+        return [{
+            'path': row[0],
+            'size': row[1],
+            'modified_time': row[2],
+            'hash': row[3],
+            'created_at': row[4],
+            'updated_at': row[5]
+        } for row in rows]
+    
+    def get_drive_file(self, file_id: str) -> Optional[Tuple[str, int]]:
+        """
+        获取Google Drive文件ID对应的本地路径和修改时间
+        
+        Args:
+            file_id: Google Drive文件ID
+            
+        Returns:
+            Optional[Tuple[str, int]]: (本地路径, 修改时间（Unix时间戳）)，不存在时返回None
+        """
+        try:
+            with self._read_connection() as conn:
+                row = conn.execute(SQL_GET_DRIVE_FILE, (file_id,)).fetchone()
+            return (row[0], row[1]) if row else None
+        except sqlite3.Error as e:
+            logger.error(f"获取Drive文件记录失败 {file_id}: {e}")
+            return None
+    
+    def get_drive_files(self, file_ids: Iterable[str]) -> Dict[str, Tuple[str, int]]:
+        """
+        批量获取Google Drive文件ID对应的本地路径和修改时间
+        
+        Args:
+            file_ids: Google Drive文件ID序列
             
-            cursor.execute("""
-                SELECT path, size, modified_time, hash, created_at, updated_at
-                FROM files
-                ORDER BY path
-            """)
+        Returns:
+            Dict[str, Tuple[str, int]]: 文件ID到(本地路径, 修改时间（Unix时间戳）)的映射，未记录的ID不包含在内
+        """
+        file_ids = list(dict.fromkeys(file_ids))
+        result = {}
+        try:
+            with self._read_connection() as conn:
+                for start in range(0, len(file_ids), IN_QUERY_SIZE):
+                    chunk = file_ids[start:start + IN_QUERY_SIZE]
+                    sql = SQL_GET_DRIVE_FILES.format(placeholders=', '.join('?' * len(chunk)))
+                    for file_id, path, mtime in conn.execute(sql, chunk):
+                        result[file_id] = (path, mtime)
+        except sqlite3.Error as e:
+            logger.error(f"批量获取Drive文件记录失败（{len(file_ids)} 条）: {e}")
+        return result
+    
+    def set_drive_file(self, file_id: str, path: str, mtime: float) -> bool:
+        """
+        记录Google Drive文件ID对应的本地路径和修改时间
+        
+        Args:
+            file_id: Google Drive文件ID
+            path: 本地路径
+            mtime: 修改时间（Unix时间戳）
             
-            return [{
-                'path': row[0],
-                'size': row[1],
-                'modified_time': datetime.fromisoformat(row[2]) if row[2] else None,
-                'hash': row[3],
-                'created_at': row[4],
-                'updated_at': row[5]
-            } for row in cursor.fetchall()] 
\ No newline at end of file
+        Returns:
+            bool: 操作是否成功
+        """
+        try:
+            with self._write_transaction() as conn:
+                conn.execute(SQL_UPSERT_DRIVE_FILE, (file_id, path, int(mtime)))
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"记录Drive文件失败 {file_id}: {e}")
+            return False
+    
+    def set_drive_files_bulk(self, rows: Iterable[Tuple[str, str, float]]) -> int:
+        """
+        在单个事务中批量记录Google Drive文件ID对应的本地路径和修改时间
+        
+        Args:
+            rows: (Google Drive文件ID, 本地路径, 修改时间（Unix时间戳）) 元组序列
+            
+        Returns:
+            int: 写入的记录数，失败时返回0
+        """
+        records = [(file_id, path, int(mtime)) for file_id, path, mtime in rows]
+        if not records:
+            return 0
+        
+        try:
+            with self._write_transaction() as conn:
+                conn.executemany(SQL_UPSERT_DRIVE_FILE, records)
+            return len(records)
+        except sqlite3.Error as e:
+            logger.error(f"批量记录Drive文件失败（{len(records)} 条）: {e}")
+            return 0
+    
+    def move_drive_paths(self, old_directory: str, new_directory: str) -> int:
+        """
+        目录移动后，将该目录下的Google Drive文件ID记录迁移到新路径
+        
+        Args:
+            old_directory: 原目录路径
+            new_directory: 新目录路径
+            
+        Returns:
+            int: 更新的记录数，失败时返回0
+        """
+        old_prefix = old_directory.rstrip(os.sep)
+        try:
+            with self._write_transaction() as conn:
+                cursor = conn.execute(SQL_MOVE_DRIVE_PATHS, (
+                    new_directory.rstrip(os.sep),
+                    len(old_prefix) + 1,
+                    old_prefix + os.sep,
+                    old_prefix + chr(ord(os.sep) + 1)
+                ))
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"迁移Drive文件记录失败 {old_directory} -> {new_directory}: {e}")
+            return 0
+    
+    def remove_drive_files_bulk(self, file_ids: Iterable[str]) -> int:
+        """
+        在单个事务中批量删除Google Drive文件ID的记录
+        
+        Args:
+            file_ids: Google Drive文件ID序列
+            
+        Returns:
+            int: 删除的记录数，失败时返回0
+        """
+        file_ids = list(file_ids)
+        if not file_ids:
+            return 0
+        
+        try:
+            with self._write_transaction() as conn:
+                cursor = conn.executemany(SQL_DELETE_DRIVE_FILE, ((file_id,) for file_id in file_ids))
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"批量删除Drive文件记录失败（{len(file_ids)} 条）: {e}")
+            return 0
+    
+    def remove_drive_file(self, file_id: str) -> bool:
+        """
+        删除Google Drive文件ID的记录
+        
+        Args:
+            file_id: Google Drive文件ID
+            
+        Returns:
+            bool: 操作是否成功
+        """
+        try:
+            with self._write_transaction() as conn:
+                conn.execute(SQL_DELETE_DRIVE_FILE, (file_id,))
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"删除Drive文件记录失败 {file_id}: {e}")
+            return False
+    
+    def get_files_fingerprint(self) -> Optional[str]:
+        """
+        获取文件表的内容指纹（由SQLite聚合计算，不逐行返回Python）
+
+        Returns:
+            Optional[str]: 指纹字符串，查询失败时返回None
+        """
+        try:
+            with self._read_connection() as conn:
+                row = conn.execute(SQL_FILES_FINGERPRINT).fetchone()
+            return ':'.join(str(value) for value in row)
+        except sqlite3.Error as e:
+            logger.error(f"计算文件表指纹失败: {e}")
+            return None
+    
+    def get_sync_state(self, key: str) -> Optional[str]:
+        """
+        获取同步状态
+        
+        Args:
+            key: 状态名称
+            
+        Returns:
+            Optional[str]: 状态值，不存在时返回None
+        """
+        try:
+            with self._read_connection() as conn:
+                row = conn.execute(SQL_GET_SYNC_STATE, (key,)).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"获取同步状态失败 {key}: {e}")
+            return None
+    
+    def set_sync_state(self, key: str, value: str) -> bool:
+        """
+        保存同步状态
+        
+        Args:
+            key: 状态名称
+            value: 状态值
+            
+        Returns:
+            bool: 操作是否成功
+        """
+        try:
+            with self._write_transaction() as conn:
+                conn.execute(SQL_UPSERT_SYNC_STATE, (key, value))
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"保存同步状态失败 {key}: {e}")
+            return False
@@ -1,36 +1,115 @@
 import os
 import sys
+import argparse
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from requests.exceptions import RequestException
 
-def download_file(url, filename):
-    try:
-        print(f'正在下载 {url}...')
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        with open(filename, 'wb') as f:
-            f.write(response.content)
-        
-        print(f'下载完成: {filename} ({len(response.content)} 字节)')
-        return True
-    except RequestException as e:
-        print(f'下载失败: {url}')
-        print(f'错误: {e}')
-        return False
-    except Exception as e:
-        print(f'发生错误: {e}')
-        return False
+# JavaScript 库文件列表: (下载地址, 期望的sha256)
+# sha256 为 None 表示尚未固定：下载后会打印实际的sha256并拒绝使用，
+# 需对照CDN公布的SRI值确认后填入此处（或写入下载目录的校验文件）
+JS_FILES = [
+    ('https://code.jquery.com/jquery-1.8.3.min.js', None),
+    ('https://code.jquery.com/ui/1.8.24/jquery-ui.min.js', None),
+    ('https://cdnjs.cloudflare.com/ajax/libs/jquery-cookie/1.4.1/jquery.cookie.min.js', None),
+    ('https://cdnjs.cloudflare.com/ajax/libs/dynatree/1.2.4/jquery.dynatree.min.js', None),
+    ('https://cdnjs.cloudflare.com/ajax/libs/jquery.tablesorter/2.31.3/js/jquery.tablesorter.min.js', None),
+]
+
+# 校验文件（sha256sum 格式），保存在下载目录中，用于补充 JS_FILES 中尚未固定的校验值
+CHECKSUM_FILE = 'SHA256SUMS'
+
+# 下载或校验失败时的最大尝试次数
+MAX_ATTEMPTS = 3
+
+# 复用同一个会话，保持与CDN主机的长连接
+_session = requests.Session()
+
+def sha256_file(filename):
+    """计算文件的sha256"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_checksums(js_dir):
+    """读取校验文件，返回 {文件名: sha256}"""
+    checksums = {}
+    path = os.path.join(js_dir, CHECKSUM_FILE)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    checksums[parts[1]] = parts[0]
+    return checksums
+
+def save_checksums(js_dir, checksums):
+    """写入校验文件"""
+    path = os.path.join(js_dir, CHECKSUM_FILE)
+    with open(path, 'w', encoding='utf-8') as f:
+        for name in sorted(checksums):
+            f.write(f'{checksums[name]}  {name}\n')
+
+def download_file(url, filename, expected_sha256=None, allow_unpinned=False):
+    """
+    下载文件并校验sha256，本地文件已通过校验时跳过下载
+
+    没有期望的sha256时不信任首次下载的内容，除非 allow_unpinned 为True
+
+    Returns:
+        str: 文件的sha256，失败时返回None
+    """
+    if expected_sha256 and os.path.exists(filename) and sha256_file(filename) == expected_sha256:
+        print(f'已存在且校验通过，跳过: {filename}')
+        return expected_sha256
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            print(f'正在下载 {url}...')
+            with _session.get(url, stream=True, timeout=10) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+
+                # 流式写入，避免将整个文件缓存在内存中
+                with open(filename, 'wb') as f:
+                    shutil.copyfileobj(response.raw, f)
+
+            digest = sha256_file(filename)
+            if not expected_sha256 and not allow_unpinned:
+                print(f'未配置sha256校验值，拒绝使用: {filename}')
+                print(f'实际sha256: {digest}（确认与CDN公布的值一致后填入 JS_FILES 或 {CHECKSUM_FILE}）')
+                os.remove(filename)
+                return None
+            if expected_sha256 and digest != expected_sha256:
+                print(f'校验失败 ({attempt}/{MAX_ATTEMPTS}): {filename}')
+                print(f'期望: {expected_sha256}，实际: {digest}')
+                continue
+
+            print(f'下载完成: {filename} ({os.path.getsize(filename)} 字节)')
+            return digest
+        except RequestException as e:
+            print(f'下载失败 ({attempt}/{MAX_ATTEMPTS}): {url}')
+            print(f'错误: {e}')
+        except Exception as e:
+            print(f'发生错误: {e}')
+            return None
+
+    # 删除未通过校验的文件，避免被误用
+    if expected_sha256 and os.path.exists(filename) and sha256_file(filename) != expected_sha256:
+        os.remove(filename)
+    return None
 
 def main():
-    # JavaScript 库文件列表
-    js_files = [
-        'https://code.jquery.com/jquery-1.8.3.min.js',
-        'https://code.jquery.com/ui/1.8.24/jquery-ui.min.js',
-        'https://cdnjs.cloudflare.com/ajax/libs/jquery-cookie/1.4.1/jquery.cookie.min.js',
-        'https://cdnjs.cloudflare.com/ajax/libs/dynatree/1.2.4/jquery.dynatree.min.js',
-        'https://cdnjs.cloudflare.com/ajax/libs/jquery.tablesorter/2.31.3/js/jquery.tablesorter.min.js'
-    ]
+    parser = argparse.ArgumentParser(description='下载JavaScript库文件并校验sha256')
+    parser.add_argument(
+        '--record', action='store_true',
+        help='接受尚未固定校验值的文件，并将其sha256写入校验文件（仅在已人工确认下载内容可信时使用）'
+    )
+    args = parser.parse_args()
 
     # 确保目录存在
     js_dir = 'templates/js'
@@ -41,14 +120,29 @@ def main():
         print(f'创建目录失败: {e}')
         return
 
-    # 下载文件
+    checksums = load_checksums(js_dir)
+
+    def fetch(item):
+        url, pinned_sha256 = item
+        name = url.rsplit('/', 1)[-1]
+        digest = download_file(url, os.path.join(js_dir, name), pinned_sha256 or checksums.get(name), args.record)
+        return name, digest
+
+    # 并行下载文件
+    with ThreadPoolExecutor(max_workers=len(JS_FILES)) as executor:
+        results = list(executor.map(fetch, JS_FILES))
+
+    # 只有显式指定 --record 时才记录未固定文件的校验值，默认不信任首次下载
     success_count = 0
-    for url in js_files:
-        filename = os.path.join(js_dir, url.split('/')[-1])
-        if download_file(url, filename):
+    for name, digest in results:
+        if digest:
             success_count += 1
+            if args.record:
+                checksums[name] = digest
+    if args.record:
+        save_checksums(js_dir, checksums)
 
-    print(f'\n下载完成: {success_count}/{len(js_files)} 个文件成功')
+    print(f'\n下载完成: {success_count}/{len(JS_FILES)} 个文件成功')
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
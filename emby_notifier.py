@@ -1,11 +1,36 @@
 import os
 import time
-from typing import Optional, Dict, List, Any
+import hashlib
+from typing import Optional, Dict, List, Any, Tuple
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from utils.logging_utils import logger
+from utils import json_utils
 from config import Config
 
+# 逐个获取媒体库配置时的并发数
+LIBRARY_FETCH_WORKERS = 8
+
+# 会话连接池大小，需覆盖并发请求数以保持长连接
+SESSION_POOL_SIZE = 32
+
+# 服务端错误时的最大重试次数及退避系数（秒）
+REQUEST_MAX_RETRIES = 3
+REQUEST_BACKOFF_FACTOR = 0.3
+
+# 字幕文件扩展名
+SUBTITLE_EXTS = frozenset({'.srt', '.ass', '.ssa', '.sub'})
+
+# 媒体库缓存文件名（与数据库放在同一目录）及格式版本
+LIBRARY_CACHE_NAME = 'emby_libraries.json'
+LIBRARY_CACHE_VERSION = 1
+
+# 路径前缀树中保存媒体库的键（路径组件不可能为None）
+_TRIE_LIBRARY = None
+
 class EmbyNotifier:
     """Emby通知器"""
     
@@ -32,13 +57,37 @@ class EmbyNotifier:
         self.session = requests.Session()
         self.session.headers.update(self.headers)
         
+        # 扩大连接池并对网关错误自动退避重试
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=SESSION_POOL_SIZE,
+            max_retries=Retry(
+                total=REQUEST_MAX_RETRIES,
+                backoff_factor=REQUEST_BACKOFF_FACTOR,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=frozenset(['GET', 'POST'])
+            )
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
         # 缓存媒体库信息
         self.libraries: Dict[str, Dict[str, Any]] = {}
         self.last_libraries_update = 0
         self.libraries_cache_ttl = 300  # 5分钟缓存
         
-        # 验证连接并初始化媒体库信息
+        # 按路径组件构建的媒体库前缀树，用于最长前缀匹配
+        self._path_trie: Dict[Any, Any] = {}
+        
+        # 媒体库缓存文件，以及生成缓存时 /Library/MediaFolders 响应的哈希
+        self._library_cache_path = os.path.join(
+            os.path.dirname(os.path.abspath(self.config.db_path)), LIBRARY_CACHE_NAME
+        )
+        self._folders_hash: Optional[str] = None
+        
+        # 验证连接并初始化媒体库信息，缓存有效时无需重新获取
         self._check_connection()
+        self._load_libraries_cache()
         self._update_libraries_cache()
     
     def _validate_config(self) -> None:
@@ -59,6 +108,69 @@ class EmbyNotifier:
             logger.error(f"Emby服务器连接失败: {e}")
             raise
     
+    def _set_libraries(self, libraries: Dict[str, Dict[str, Any]]) -> None:
+        """
+        设置媒体库信息并重建路径索引
+        
+        Args:
+            libraries: 媒体库ID到媒体库信息的映射
+        """
+        self.libraries = libraries
+        trie: Dict[Any, Any] = {}
+        for library in self.libraries.values():
+            for lib_path in library['paths']:
+                node = trie
+                for part in self._split_path(lib_path):
+                    node = node.setdefault(part, {})
+                # 多个媒体库包含同一路径时保留先出现的
+                node.setdefault(_TRIE_LIBRARY, library)
+        self._path_trie = trie
+    
+    @staticmethod
+    def _split_path(path: str) -> List[str]:
+        """
+        规范化路径并拆分为路径组件（不区分大小写的系统上统一转为小写）
+        
+        Args:
+            path: 路径
+            
+        Returns:
+            List[str]: 路径组件列表
+        """
+        return [part for part in os.path.normcase(os.path.normpath(path)).split(os.sep) if part]
+    
+    def _load_libraries_cache(self) -> None:
+        """从缓存文件加载媒体库信息，缓存的更新时间取文件修改时间"""
+        try:
+            with open(self._library_cache_path, 'rb') as f:
+                data = json_utils.loads(f.read())
+            if data.get('version') != LIBRARY_CACHE_VERSION or data.get('host') != self.base_url:
+                return
+            self._set_libraries(data['libraries'])
+            self._folders_hash = data.get('folders_hash')
+            self.last_libraries_update = os.path.getmtime(self._library_cache_path)
+            logger.info(f"已从缓存加载媒体库信息，共{len(self.libraries)}个库")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"读取媒体库缓存失败 {self._library_cache_path}: {e}")
+    
+    def _save_libraries_cache(self) -> None:
+        """原子地写入媒体库缓存文件"""
+        tmp_path = f"{self._library_cache_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(json_utils.dumps({
+                    'version': LIBRARY_CACHE_VERSION,
+                    'host': self.base_url,
+                    'folders_hash': self._folders_hash,
+                    'libraries': self.libraries
+                }))
+            os.replace(tmp_path, self._library_cache_path)
+        except Exception as e:
+            # 缓存只是加速手段，写入失败不影响通知
+            logger.warning(f"写入媒体库缓存失败 {self._library_cache_path}: {e}")
+    
     def _update_libraries_cache(self) -> None:
         """更新媒体库缓存"""
         try:
@@ -68,31 +180,34 @@ class EmbyNotifier:
                 
             response = self.session.get(f"{self.base_url}/Library/MediaFolders")
             response.raise_for_status()
-            items = response.json().get('Items', [])
             
-            # 获取每个媒体库的详细配置
+            # 媒体库列表未变化时沿用已有配置，只刷新缓存时间
+            folders_hash = hashlib.sha256(response.content).hexdigest()
+            if self.libraries and folders_hash == self._folders_hash:
+                self.last_libraries_update = current_time
+                self._save_libraries_cache()
+                logger.debug("媒体库列表未变化，沿用缓存")
+                return
+            
+            items = json_utils.loads(response.content).get('Items', [])
+            
+            # 获取所有媒体库的详细配置
+            library_configs = self._fetch_library_configs(items)
+            libraries = {}
             for item in items:
                 library_id = item['Id']
-                try:
-                    config_response = self.session.get(
-                        f"{self.base_url}/Library/VirtualFolders/LibraryOptions",
-                        params={'libraryId': library_id}
-                    )
-                    config_response.raise_for_status()
-                    library_config = config_response.json()
-                except requests.RequestException as e:
-                    logger.warning(f"获取媒体库[{item['Name']}]配置失败: {e}")
-                    library_config = {}
-                
-                self.libraries[library_id] = {
+                libraries[library_id] = {
                     'id': library_id,
                     'name': item['Name'],
                     'type': item.get('CollectionType', ''),
                     'paths': item.get('Paths', []),
-                    'config': library_config
+                    'config': library_configs.get(library_id, {})
                 }
+            self._set_libraries(libraries)
             
+            self._folders_hash = folders_hash
             self.last_libraries_update = current_time
+            self._save_libraries_cache()
             logger.info(f"媒体库缓存已更新，共{len(self.libraries)}个库")
             for lib in self.libraries.values():
                 logger.info(f"- {lib['name']} ({lib['type']}): {', '.join(lib['paths'])}")
@@ -100,6 +215,45 @@ class EmbyNotifier:
         except Exception as e:
             logger.error(f"更新媒体库缓存失败: {e}")
     
+    def _fetch_library_configs(self, items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        获取媒体库配置：优先通过 /Library/VirtualFolders 一次性获取全部配置，
+        接口不可用时并发逐个获取
+        
+        Args:
+            items: /Library/MediaFolders 返回的媒体库列表
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: 媒体库ID到配置的映射
+        """
+        try:
+            response = self.session.get(f"{self.base_url}/Library/VirtualFolders")
+            response.raise_for_status()
+            return {
+                folder['ItemId']: folder.get('LibraryOptions', {})
+                for folder in json_utils.loads(response.content)
+                if folder.get('ItemId')
+            }
+        except (requests.RequestException, ValueError, TypeError) as e:
+            logger.warning(f"批量获取媒体库配置失败，改为逐个获取: {e}")
+        
+        def fetch(item: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                config_response = self.session.get(
+                    f"{self.base_url}/Library/VirtualFolders/LibraryOptions",
+                    params={'libraryId': item['Id']}
+                )
+                config_response.raise_for_status()
+                return json_utils.loads(config_response.content)
+            except (requests.RequestException, ValueError) as e:
+                logger.warning(f"获取媒体库[{item['Name']}]配置失败: {e}")
+                return {}
+        
+        if not items:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(LIBRARY_FETCH_WORKERS, len(items))) as executor:
+            return {item['Id']: config for item, config in zip(items, executor.map(fetch, items))}
+    
     def _find_library_for_path(self, path: str) -> Optional[Dict[str, Any]]:
         """
         查找包含指定路径的媒体库信息
@@ -114,20 +268,16 @@ class EmbyNotifier:
             # 更新缓存
             self._update_libraries_cache()
             
-            # 规范化路径
-            norm_path = os.path.normpath(path)
-            longest_match = 0
-            matched_library = None
-            
-            # 查找最匹配的媒体库
-            for library in self.libraries.values():
-                for lib_path in library['paths']:
-                    lib_path = os.path.normpath(lib_path)
-                    if norm_path.startswith(lib_path) and len(lib_path) > longest_match:
-                        longest_match = len(lib_path)
-                        matched_library = library
+            # 沿前缀树逐级向下，记录最后经过的媒体库即为最长前缀匹配
+            node = self._path_trie
+            library = node.get(_TRIE_LIBRARY)
+            for part in self._split_path(path):
+                node = node.get(part)
+                if node is None:
+                    break
+                library = node.get(_TRIE_LIBRARY, library)
             
-            return matched_library
+            return library
             
         except Exception as e:
             logger.error(f"查找媒体库失败: {e}")
@@ -143,75 +293,80 @@ class EmbyNotifier:
         Returns:
             bool: 是否是字幕文件
         """
-        subtitle_exts = {'.srt', '.ass', '.ssa', '.sub'}
-        return os.path.splitext(path)[1].lower() in subtitle_exts
+        dot = path.rfind('.')
+        # 点号需位于最后一级路径内，避免把目录名中的点当作扩展名
+        return dot > path.rfind(os.sep) and path[dot:].lower() in SUBTITLE_EXTS
     
-    def refresh_library(self, path: str, is_delete: bool = False) -> bool:
+    def _build_update(self, path: str, is_delete: bool) -> Dict[str, str]:
         """
-        刷新媒体库中的指定路径
+        构建单个路径的媒体库更新项
         
         Args:
             path: 文件路径
             is_delete: 是否是删除操作
             
+        Returns:
+            Dict[str, str]: /Library/Media/Updated 的更新项
+        """
+        # 查找相关的媒体库
+        library = self._find_library_for_path(path)
+        if not library:
+            # 如果找不到对应的媒体库，尝试直接刷新路径
+            logger.warning(f"未找到包含路径的媒体库，尝试直接刷新: {path}")
+        elif self._is_subtitle_file(path):
+            # 对于字幕文件，只刷新其所在目录
+            path = os.path.dirname(path)
+        
+        return {
+            'Path': path,
+            'UpdateType': "Deleted" if is_delete else "Modified"
+        }
+    
+    def refresh_library_batch(self, items: List[Tuple[str, bool]]) -> bool:
+        """
+        通过一次请求刷新媒体库中的多个路径
+        
+        Args:
+            items: (文件路径, 是否是删除操作) 列表
+            
         Returns:
             bool: 是否成功
         """
+        if not items:
+            return True
+        
         try:
-            # 查找相关的媒体库
-            library = self._find_library_for_path(path)
-            if not library:
-                # 如果找不到对应的媒体库，尝试直接刷新路径
-                logger.warning(f"未找到包含路径的媒体库，尝试直接刷新: {path}")
-                response = self.session.post(
-                    f"{self.base_url}/Library/Media/Updated",
-                    json={
-                        'Updates': [{
-                            'Path': path,
-                            'UpdateType': "Deleted" if is_delete else "Modified"
-                        }]
-                    }
-                )
-                response.raise_for_status()
-                logger.info(f"媒体库刷新请求已发送: {path}")
-                return True
-            
-            # 构建更新请求
-            update_type = "Deleted" if is_delete else "Modified"
-            is_subtitle = self._is_subtitle_file(path)
-            
-            if is_subtitle:
-                # 对于字幕文件，只刷新其所在目录
-                parent_dir = os.path.dirname(path)
-                response = self.session.post(
-                    f"{self.base_url}/Library/Media/Updated",
-                    json={
-                        'Updates': [{
-                            'Path': parent_dir,
-                            'UpdateType': update_type
-                        }]
-                    }
-                )
-            else:
-                # 对于视频文件，直接刷新文件
-                response = self.session.post(
-                    f"{self.base_url}/Library/Media/Updated",
-                    json={
-                        'Updates': [{
-                            'Path': path,
-                            'UpdateType': update_type
-                        }]
-                    }
-                )
+            # 合并重复的更新项（如同一目录下的多个字幕文件）
+            updates = {}
+            for path, is_delete in items:
+                update = self._build_update(path, is_delete)
+                updates[(update['Path'], update['UpdateType'])] = update
             
+            response = self.session.post(
+                f"{self.base_url}/Library/Media/Updated",
+                data=json_utils.dumps({'Updates': list(updates.values())})
+            )
             response.raise_for_status()
-            logger.info(f"媒体库[{library['name']}]刷新请求已发送: {path}")
+            logger.info(f"媒体库刷新请求已发送: {len(updates)} 个路径")
             return True
             
         except requests.RequestException as e:
             logger.error(f"刷新媒体库失败: {e}")
             return False
     
+    def refresh_library(self, path: str, is_delete: bool = False) -> bool:
+        """
+        刷新媒体库中的指定路径
+        
+        Args:
+            path: 文件路径
+            is_delete: 是否是删除操作
+            
+        Returns:
+            bool: 是否成功
+        """
+        return self.refresh_library_batch([(path, is_delete)])
+    
     def notify_file_change(self, path: str, is_delete: bool = False) -> None:
         """
         通知文件变化
@@ -229,6 +384,22 @@ class EmbyNotifier:
         except Exception as e:
             logger.error(f"处理文件变化通知失败: {e}")
     
+    def notify_file_changes(self, items: List[Tuple[str, bool]]) -> None:
+        """
+        批量通知文件变化
+        
+        Args:
+            items: (变化的文件路径, 是否是删除操作) 列表
+        """
+        try:
+            if self.refresh_library_batch(items):
+                logger.info(f"已通知Emby刷新 {len(items)} 个文件变化")
+            else:
+                logger.warning(f"通知Emby刷新失败: {len(items)} 个文件变化")
+                
+        except Exception as e:
+            logger.error(f"处理文件变化通知失败: {e}")
+    
     def close(self) -> None:
         """关闭通知器"""
         if self.session:
@@ -1,15 +1,131 @@
 import os
+import sys
 import time
-from typing import Optional, Callable, Dict, Any, List
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, Any, List, Tuple
 from datetime import datetime, timedelta, timezone
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+from googleapiclient.model import JsonModel
+from googleapiclient.errors import HttpError
+import google_auth_httplib2
+import httplib2
 from utils.logging_utils import logger
+from utils.cache_utils import LRUCache
+from utils.debounce_utils import Debouncer
+from utils import json_utils
 from db_manager import DatabaseManager
 from config import Config
 
+# 优先使用C实现的ciso8601解析时间，未安装时回退到标准库
+try:
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
+# Python 3.11起 datetime.fromisoformat 可直接解析带 'Z' 后缀的时间
+_FROMISOFORMAT_ACCEPTS_Z = sys.version_info >= (3, 11)
+
+# 单个批量请求中包含的最大子请求数（Drive API限制为100）
+BATCH_REQUEST_LIMIT = 100
+
+# 目录ID到(名称, 父目录ID)的缓存大小
+PARENT_CACHE_SIZE = 10000
+
+# 并发执行批量请求的最大线程数
+DRIVE_FETCH_WORKERS = 8
+
+# 单个HTTP请求的超时时间（秒）
+DRIVE_HTTP_TIMEOUT = 60
+
+# 请求遇到5xx或限流错误时由客户端库按指数退避重试的次数
+DRIVE_NUM_RETRIES = 3
+
+# 连续无变化时轮询间隔的增长倍数
+IDLE_BACKOFF_FACTOR = 1.5
+
+# 检查失败后的重试等待：从3秒开始逐次翻倍，最长60秒
+ERROR_BACKOFF_BASE = 3
+ERROR_BACKOFF_MAX = 60
+
+# 等待时间附加的随机抖动比例，避免多个实例同步轮询
+POLL_JITTER_RATIO = 0.2
+
+# 访问令牌在到期前多久提前刷新（秒）
+TOKEN_REFRESH_MARGIN = 300
+
+# 变更列表每页返回的最大条目数
+CHANGES_PAGE_SIZE = 1000
+
+# 变更列表需要返回的字段，包含构建路径所需的文件元数据
+CHANGES_FIELDS = (
+    'nextPageToken, newStartPageToken, '
+    'changes(fileId, removed, file(id, name, mimeType, modifiedTime, size, parents, trashed))'
+)
+
+# 数据库中保存变更列表页面令牌的状态名称
+PAGE_TOKEN_STATE_KEY = 'gdrive_page_token'
+
+# Google Drive文件夹的MIME类型
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Google在线文档（文档、表格、快捷方式等）的MIME类型前缀
+GOOGLE_APPS_MIME_PREFIX = 'application/vnd.google-apps.'
+
+# 目录不存在或无权访问时在目录缓存中记录的占位值（该目录之下的文件不在监控范围内）
+_INACCESSIBLE_FOLDER = (None, None)
+
+# 数据库中目录ID记录使用的修改时间占位值，用于与文件记录区分（文件的修改时间不为负）
+_FOLDER_ROW_MTIME = -1
+
+# 进程内复用的凭证及API服务：refresh_token -> (凭证, Drive服务)
+# 重复start()/stop()时无需重新构建服务
+_SERVICE_CACHE: Dict[str, Tuple[Credentials, Any]] = {}
+
+def _parse_drive_time(value: str) -> int:
+    """
+    将Drive返回的RFC 3339时间（如 2024-01-01T00:00:00.000Z）转换为Unix时间戳
+    
+    Args:
+        value: 时间字符串
+        
+    Returns:
+        int: Unix时间戳（秒），与数据库中保存的精度一致
+    """
+    if ciso8601 is not None:
+        return int(ciso8601.parse_datetime(value).timestamp())
+    if _FROMISOFORMAT_ACCEPTS_Z:
+        return int(datetime.fromisoformat(value).timestamp())
+    return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+
+class ParentNotResolvedError(Exception):
+    """上级目录信息获取失败（如请求被限流），无法判断文件的本地路径"""
+
+class FastJsonModel(JsonModel):
+    """直接从响应字节串解析JSON（使用json_utils，安装了orjson时无需先解码为str）"""
+    
+    def deserialize(self, content: Any) -> Any:
+        """
+        反序列化响应内容
+        
+        Args:
+            content: 响应内容（字节串或字符串）
+            
+        Returns:
+            Any: 反序列化后的对象，不是合法JSON时交给默认实现处理
+        """
+        try:
+            body = json_utils.loads(content)
+        except ValueError:
+            return super().deserialize(content)
+        if self._data_wrapper and isinstance(body, dict) and 'data' in body:
+            body = body['data']
+        return body
+
 class GoogleDriveMonitor:
     """Google Drive监控器"""
     
@@ -22,21 +138,38 @@ class GoogleDriveMonitor:
     def __init__(self, 
                  db_manager: DatabaseManager,
                  config: Config,
-                 on_file_change: Optional[Callable[[str], None]] = None):
+                 on_file_change: Optional[Callable[[str, bool], None]] = None,
+                 on_batch_change: Optional[Callable[[List[Tuple[str, bool]]], None]] = None):
         """
         初始化Google Drive监控器
         
         Args:
             db_manager: 数据库管理器实例
             config: 配置实例
-            on_file_change: 文件变化回调函数
+            on_file_change: 文件变化回调函数，参数为(路径, 是否删除)
+            on_batch_change: 批量文件变化回调函数，参数为一批变化的(路径, 是否删除)列表
         """
         self.db_manager = db_manager
         self.config = config
         self.on_file_change = on_file_change
+        self.on_batch_change = on_batch_change
         self.drive_service = None
-        self.activity_service = None
-        self.last_check_time = None
+        self._credentials = None
+        # httplib2.Http非线程安全，并发请求时每个线程使用独立的连接；
+        # 线程池跨轮询保留，使各线程的长连接得以复用
+        self._thread_local = threading.local()
+        self._fetch_executor: Optional[ThreadPoolExecutor] = None
+        
+        # 停止信号，可立即唤醒等待中的轮询循环
+        self._stop_event = threading.Event()
+        # 变化通知经合并窗口去重后在后台线程中执行，与下一轮轮询重叠
+        self._debouncer: Optional[Debouncer] = None
+        
+        # 变更列表的页面令牌，持久化在数据库中，重启后从上次位置继续
+        self._page_token: Optional[str] = None
+        
+        # 目录ID -> (名称, 父目录ID)，跨轮询复用，避免逐级请求父目录
+        self._parent_cache = LRUCache(PARENT_CACHE_SIZE)
     
     def _load_credentials(self) -> None:
         """加载Google Drive API凭证"""
@@ -60,58 +193,230 @@ class GoogleDriveMonitor:
             if expiry.tzinfo is None:
                 expiry = expiry.replace(tzinfo=timezone.utc)
             
-            # 使用配置中的凭证创建credentials
-            creds = Credentials(
-                token=self.config.gdrive_token['access_token'],
-                refresh_token=self.config.gdrive_token['refresh_token'],
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=self.config.gdrive_client_id,
-                client_secret=self.config.gdrive_client_secret,
-                expiry=expiry,
-                scopes=self.SCOPES  # 添加权限范围
-            )
+            # 同一令牌已构建过服务时直接复用
+            refresh_token = self.config.gdrive_token['refresh_token']
+            cached = _SERVICE_CACHE.get(refresh_token)
+            if cached:
+                creds, drive_service = cached
+                # 凭证对象刷新后expiry为不带时区的UTC时间
+                expiry = creds.expiry.replace(tzinfo=timezone.utc) if creds.expiry else expiry
+            else:
+                # 使用配置中的凭证创建credentials
+                creds = Credentials(
+                    token=self.config.gdrive_token['access_token'],
+                    refresh_token=refresh_token,
+                    token_uri="https://oauth2.googleapis.com/token",
+                    client_id=self.config.gdrive_client_id,
+                    client_secret=self.config.gdrive_client_secret,
+                    expiry=expiry,
+                    scopes=self.SCOPES  # 添加权限范围
+                )
+                drive_service = None
             
             # 获取当前UTC时间
             now = datetime.now(timezone.utc)
             # 手动检查是否过期
             if now >= expiry:
                 logger.info("Google Drive令牌已过期，正在刷新...")
-                creds.refresh(Request())
-                # 更新配置中的token
-                self.config.gdrive_token.update({
-                    'token_type': 'Bearer',
-                    'access_token': creds.token,
-                    'refresh_token': creds.refresh_token,
-                    'expiry': creds.expiry.replace(tzinfo=timezone.utc).isoformat()
-                })
-                # 保存更新后的配置
-                self.config.save_to_yaml('config.yaml')
-                logger.info("Google Drive令牌已刷新并保存")
-            
-            # 创建Drive和Activity服务
-            self.drive_service = build('drive', 'v3', credentials=creds)
-            self.activity_service = build('driveactivity', 'v2', credentials=creds)
+                self._refresh_credentials(creds)
+            
+            # 创建Drive服务（使用客户端库内置的发现文档，不发起网络请求）
+            if drive_service is None:
+                drive_service = build(
+                    'drive', 'v3', http=self._new_http(creds),
+                    static_discovery=True, cache_discovery=False,
+                    model=FastJsonModel()
+                )
+                _SERVICE_CACHE[refresh_token] = (creds, drive_service)
+            
+            self._credentials = creds
+            self.drive_service = drive_service
             logger.info("Google Drive API凭证加载成功")
             
         except Exception as e:
             logger.error(f"加载Google Drive API凭证失败: {e}")
             raise
     
-    def _get_file_info(self, file_id: str) -> Optional[Dict[str, Any]]:
+    def _refresh_credentials(self, creds: Credentials) -> None:
+        """
+        刷新访问令牌并保存到配置文件
+        
+        Args:
+            creds: 凭证
+        """
+        creds.refresh(Request())
+        # 更新配置中的token
+        self.config.gdrive_token.update({
+            'token_type': 'Bearer',
+            'access_token': creds.token,
+            'refresh_token': creds.refresh_token,
+            'expiry': creds.expiry.replace(tzinfo=timezone.utc).isoformat()
+        })
+        # 保存更新后的配置
+        self.config.save_to_yaml('config.yaml')
+        logger.info("Google Drive令牌已刷新并保存")
+    
+    def _refresh_token_if_needed(self, horizon: float = 0) -> None:
+        """
+        访问令牌将在指定时间内到期时提前刷新，避免在检查过程中因令牌过期而阻塞
+        
+        Args:
+            horizon: 距下一次使用令牌的时间（秒）
+        """
+        creds = self._credentials
+        if creds is None or creds.expiry is None:
+            return
+        # 凭证对象中的expiry为不带时区的UTC时间
+        remaining = creds.expiry.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)
+        if remaining > timedelta(seconds=horizon + TOKEN_REFRESH_MARGIN):
+            return
+        try:
+            self._refresh_credentials(creds)
+        except Exception as e:
+            # 刷新失败时由请求时的自动刷新兜底
+            logger.warning(f"提前刷新Google Drive令牌失败: {e}")
+    
+    @staticmethod
+    def _new_http(creds: Credentials) -> google_auth_httplib2.AuthorizedHttp:
+        """
+        创建已授权的HTTP连接（同一实例内保持长连接）
+        
+        Args:
+            creds: 凭证
+            
+        Returns:
+            google_auth_httplib2.AuthorizedHttp: HTTP连接
+        """
+        return google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=DRIVE_HTTP_TIMEOUT))
+    
+    def _thread_http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """
+        获取当前线程专用的已授权HTTP连接
+        
+        Returns:
+            google_auth_httplib2.AuthorizedHttp: 当前线程的HTTP连接
+        """
+        http = getattr(self._thread_local, 'http', None)
+        if http is None:
+            http = self._new_http(self._credentials)
+            self._thread_local.http = http
+        return http
+    
+    def _batch_get_files(self, file_ids: List[str],
+                         fields: str) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """
+        通过批量请求获取多个文件的元数据
+        
+        Args:
+            file_ids: Google Drive文件ID列表
+            fields: 需要返回的字段
+            
+        Returns:
+            Tuple[Dict[str, Dict[str, Any]], List[str]]: (文件ID到元数据的映射, 因文件不存在以外的原因
+            获取失败的文件ID列表)，获取失败或不存在的文件不包含在映射中
+        """
+        results = {}
+        failed = []
+        
+        def callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            elif isinstance(exception, HttpError) and exception.resp.status == 404:
+                logger.warning(f"文件不存在或无权访问 {request_id}")
+            else:
+                logger.error(f"获取文件信息失败 {request_id}: {exception}")
+                failed.append(request_id)
+        
+        def execute_chunk(chunk, http=None):
+            batch = self.drive_service.new_batch_http_request(callback=callback)
+            for file_id in chunk:
+                batch.add(
+                    self.drive_service.files().get(fileId=file_id, fields=fields),
+                    request_id=file_id
+                )
+            batch.execute(http=http)
+        
+        chunks = [
+            file_ids[start:start + BATCH_REQUEST_LIMIT]
+            for start in range(0, len(file_ids), BATCH_REQUEST_LIMIT)
+        ]
+        if len(chunks) <= 1:
+            for chunk in chunks:
+                execute_chunk(chunk)
+            return results, failed
+        
+        # 多个批量请求互不依赖，并发执行以重叠网络往返
+        def execute_in_worker(chunk):
+            execute_chunk(chunk, self._thread_http())
+        
+        if self._fetch_executor is None:
+            self._fetch_executor = ThreadPoolExecutor(
+                max_workers=DRIVE_FETCH_WORKERS, thread_name_prefix="GoogleDriveFetch"
+            )
+        for future in [self._fetch_executor.submit(execute_in_worker, chunk) for chunk in chunks]:
+            future.result()
+        
+        return results, failed
+    
+    def _resolve_parents(self, parent_ids: List[str]) -> None:
+        """
+        逐级批量获取父目录信息并写入缓存，每一级只发送一次批量请求
+        
+        Args:
+            parent_ids: 父目录ID列表
+            
+        Raises:
+            ParentNotResolvedError: 部分目录因不存在以外的原因获取失败
+        """
+        pending = set(parent_ids)
+        while pending:
+            missing = [
+                parent_id for parent_id in pending
+                if parent_id != self.config.gdrive_root_folder_id
+                and parent_id not in self._parent_cache
+            ]
+            if not missing:
+                break
+            
+            fetched, failed = self._batch_get_files(missing, 'id, name, parents')
+            if failed:
+                raise ParentNotResolvedError(f"{len(failed)} 个上级目录获取失败")
+            pending = set()
+            for parent_id in missing:
+                parent = fetched.get(parent_id)
+                if parent is None:
+                    # 目录不存在或无权访问，其下的文件按不在监控范围内处理
+                    self._parent_cache.put(parent_id, _INACCESSIBLE_FOLDER)
+                    continue
+                grandparent_id = parent['parents'][0] if parent.get('parents') else None
+                self._parent_cache.put(parent_id, (parent['name'], grandparent_id))
+                if grandparent_id:
+                    pending.add(grandparent_id)
+    
+    def _get_file_info(self,
+                       file_id: str,
+                       file: Optional[Dict[str, Any]] = None,
+                       mtime: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
         获取文件信息
         
         Args:
             file_id: Google Drive文件ID
+            file: 已获取的文件元数据（可选，未提供时单独请求）
+            mtime: 已解析的修改时间（可选，未提供时从元数据解析）
             
         Returns:
-            Optional[Dict[str, Any]]: 文件信息字典
+            Optional[Dict[str, Any]]: 文件信息字典，不在监控范围内时返回None
+            
+        Raises:
+            ParentNotResolvedError: 上级目录获取失败，无法判断文件的本地路径
         """
         try:
-            file = self.drive_service.files().get(
-                fileId=file_id,
-                fields='id, name, mimeType, modifiedTime, size, parents'
-            ).execute()
+            if file is None:
+                file = self.drive_service.files().get(
+                    fileId=file_id,
+                    fields='id, name, mimeType, modifiedTime, size, parents'
+                ).execute(num_retries=DRIVE_NUM_RETRIES)
             
             # 构建本地路径
             path = self._build_local_path(file)
@@ -121,9 +426,11 @@ class GoogleDriveMonitor:
             return {
                 'path': path,
                 'size': int(file.get('size', 0)),
-                'mtime': datetime.fromisoformat(file['modifiedTime'].replace('Z', '+00:00')).timestamp()
+                'mtime': mtime if mtime is not None else _parse_drive_time(file['modifiedTime'])
             }
             
+        except ParentNotResolvedError:
+            raise
         except Exception as e:
             logger.error(f"获取文件信息失败 {file_id}: {e}")
             return None
@@ -136,133 +443,353 @@ class GoogleDriveMonitor:
             file: Google Drive文件信息
             
         Returns:
-            Optional[str]: 本地路径
+            Optional[str]: 本地路径，所有上级目录均已获取且不在监控范围内时返回None
+            
+        Raises:
+            ParentNotResolvedError: 上级目录获取失败
         """
         try:
-            # 如果不是根目录，递归获取父目录路径
-            if 'parents' in file:
-                parent_id = file['parents'][0]
-                if parent_id != self.config.gdrive_root_folder_id:
-                    parent = self.drive_service.files().get(
-                        fileId=parent_id,
-                        fields='id, name, parents'
-                    ).execute()
-                    parent_path = self._build_local_path(parent)
-                    if parent_path:
-                        return os.path.join(parent_path, file['name'])
-            
-            # 构建完整路径
-            full_path = os.path.join('/', file['name'])
-            
-            # 检查是否包含目标路径
-            if self.config.gdrive_root_path in full_path:
-                # 找到目标路径在完整路径中的位置
-                target_index = full_path.find(self.config.gdrive_root_path)
-                # 提取目标路径及其后面的部分
-                target_path = full_path[target_index:]
-                # 替换为本地路径
-                local_path = target_path.replace(self.config.gdrive_root_path, self.config.local_root_path)
-                return local_path
+            # 从缓存中逐级向上收集名称，直到根目录
+            names = [file['name']]
+            parent_id = file['parents'][0] if file.get('parents') else None
+            if parent_id:
+                self._resolve_parents([parent_id])
+            while parent_id and parent_id != self.config.gdrive_root_folder_id:
+                cached = self._parent_cache.get(parent_id)
+                if cached is None:
+                    raise ParentNotResolvedError(f"上级目录未获取: {parent_id}")
+                if cached is _INACCESSIBLE_FOLDER:
+                    return None
+                name, parent_id = cached
+                names.append(name)
             
-            return None
+            # 从最上层开始拼接：找到包含目标路径的目录后，其下的各级依次追加
+            local_path = None
+            for name in reversed(names):
+                if local_path:
+                    local_path = os.path.join(local_path, name)
+                    continue
+                
+                # 构建完整路径
+                full_path = os.path.join('/', name)
+                
+                # 检查是否包含目标路径
+                if self.config.gdrive_root_path in full_path:
+                    # 找到目标路径在完整路径中的位置
+                    target_index = full_path.find(self.config.gdrive_root_path)
+                    # 提取目标路径及其后面的部分
+                    target_path = full_path[target_index:]
+                    # 替换为本地路径
+                    local_path = target_path.replace(self.config.gdrive_root_path, self.config.local_root_path)
             
+            return local_path
+            
+        except ParentNotResolvedError:
+            raise
         except Exception as e:
             logger.error(f"构建本地路径失败 {file.get('id')}: {e}")
             return None
     
-    def _get_file_id_from_activity(self, target: Dict[str, Any]) -> Optional[str]:
+    def _cached_folder_path(self, folder_id: str, strict: bool = False) -> Optional[str]:
         """
-        从活动目标中提取文件ID
+        根据目录缓存构建目录的本地路径
         
         Args:
-            target: 活动目标信息
+            folder_id: 目录ID
+            strict: 上级目录获取失败时是否抛出异常（为False时视为路径未知，返回None）
             
         Returns:
-            Optional[str]: 文件ID
+            Optional[str]: 本地路径，目录未缓存或不在监控范围内时返回None
+            
+        Raises:
+            ParentNotResolvedError: strict为True且上级目录获取失败
         """
-        try:
-            if 'driveItem' in target:
-                # 从类似 "items/1234567" 的格式中提取ID
-                return target['driveItem']['name'].split('/')[-1]
+        cached = self._parent_cache.get(folder_id)
+        if cached is None or cached is _INACCESSIBLE_FOLDER:
             return None
-        except Exception:
+        name, parent_id = cached
+        try:
+            return self._build_local_path({
+                'id': folder_id,
+                'name': name,
+                'parents': [parent_id] if parent_id else []
+            })
+        except ParentNotResolvedError:
+            if strict:
+                raise
             return None
     
-    def _check_changes(self) -> None:
-        """检查文件变化"""
-        try:
-            current_time = datetime.utcnow()
-            
-            # 计算查询时间范围
-            if self.last_check_time:
-                # 使用上次检查时间作为起点
-                start_time = self.last_check_time
-            else:
-                # 首次运行时，查询一个完整周期加缓冲时间的范围
-                start_time = current_time - timedelta(
-                    seconds=self.config.gdrive_polling_interval + self.config.gdrive_query_buffer_time
-                )
+    def _folder_rows(self, folder_ids: List[str]) -> List[Tuple[str, str, int]]:
+        """
+        收集目录及其各级上级目录需要写入数据库的本地路径记录
+        
+        目录缓存只在进程内有效，重启后目录被重命名、移动或删除时依靠这些记录找到原路径
+        
+        Args:
+            folder_ids: 目录ID列表（上级目录须已获取）
             
-            # 构建查询请求
+        Returns:
+            List[Tuple[str, str, int]]: 路径未记录或已变化的(目录ID, 本地路径, 修改时间占位值)列表
+        """
+        paths = {}
+        for folder_id in folder_ids:
+            while folder_id and folder_id != self.config.gdrive_root_folder_id and folder_id not in paths:
+                cached = self._parent_cache.get(folder_id)
+                if cached is None or cached is _INACCESSIBLE_FOLDER:
+                    break
+                paths[folder_id] = self._cached_folder_path(folder_id)
+                folder_id = cached[1]
+        
+        recorded = self.db_manager.get_drive_files(paths)
+        return [
+            (folder_id, path, _FOLDER_ROW_MTIME)
+            for folder_id, path in paths.items()
+            if path and recorded.get(folder_id) != (path, _FOLDER_ROW_MTIME)
+        ]
+    
+    def _get_start_page_token(self) -> str:
+        """
+        获取当前的变更列表起始页面令牌
+        
+        Returns:
+            str: 页面令牌
+        """
+        request = {'supportsAllDrives': True}
+        if self.config.gdrive_team_drive_id:
+            request['driveId'] = self.config.gdrive_team_drive_id
+        return self.drive_service.changes().getStartPageToken(**request).execute(num_retries=DRIVE_NUM_RETRIES)['startPageToken']
+    
+    def _list_changes(self) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        获取自上次页面令牌以来的全部变更
+        
+        Returns:
+            Tuple[List[Dict[str, Any]], str]: (变更列表, 下一次检查使用的页面令牌)
+        """
+        changes = []
+        page_token = self._page_token
+        while True:
             request = {
-                'pageSize': 100,  # 每页活动数量
-                'filter': f'''
-                    time >= "{start_time.isoformat()}Z"
-                    AND time <= "{current_time.isoformat()}Z"
-                '''
+                'pageToken': page_token,
+                'pageSize': CHANGES_PAGE_SIZE,
+                'spaces': 'drive',
+                'includeRemoved': True,
+                'includeItemsFromAllDrives': True,
+                'supportsAllDrives': True,
+                'fields': CHANGES_FIELDS
             }
-
-            # 如果指定了团队硬盘ID，添加相关参数
+            # 如果指定了团队硬盘ID，只获取该硬盘的变更
             if self.config.gdrive_team_drive_id:
-                request['ancestorName'] = f'items/{self.config.gdrive_team_drive_id}'
-
-            # 获取活动列表
-            response = self.activity_service.activity().query(body=request).execute()
-            activities = response.get('activities', [])
-
-            # 处理每个活动
-            for activity in activities:
-                # 获取活动时间
-                activity_time = datetime.fromisoformat(
-                    activity['timestamp'].replace('Z', '+00:00')
-                )
-
-                # 处理活动目标
-                for target in activity.get('targets', []):
-                    file_id = self._get_file_id_from_activity(target)
-                    if not file_id:
-                        continue
-
-                    # 获取文件信息
-                    file_info = self._get_file_info(file_id)
-                    if not file_info:
-                        continue
-
-                    # 检查文件是否已存在于数据库
-                    existing_info = self.db_manager.get_file_info(file_info['path'])
-                    if existing_info:
-                        if existing_info['mtime'] == file_info['mtime']:
-                            logger.debug(f"文件未变化，跳过处理: {file_info['path']}")
-                            continue
-                        logger.info(f"更新文件记录: {file_info['path']}")
+                request['driveId'] = self.config.gdrive_team_drive_id
+            
+            response = self.drive_service.changes().list(**request).execute(num_retries=DRIVE_NUM_RETRIES)
+            changes.extend(response.get('changes', []))
+            if 'newStartPageToken' in response:
+                return changes, response['newStartPageToken']
+            page_token = response['nextPageToken']
+    
+    def _check_changes(self) -> Optional[int]:
+        """
+        检查文件变化
+        
+        Returns:
+            Optional[int]: 本次获取到的变更数量，检查失败时返回None
+        """
+        try:
+            # 首次运行时从当前位置开始记录变更
+            if self._page_token is None:
+                self._page_token = self.db_manager.get_sync_state(PAGE_TOKEN_STATE_KEY)
+            if self._page_token is None:
+                self._page_token = self._get_start_page_token()
+                self.db_manager.set_sync_state(PAGE_TOKEN_STATE_KEY, self._page_token)
+                logger.info("已获取Google Drive变更起始位置")
+                return 0
+            
+            # 只获取自上次检查以来的变更
+            changes, next_page_token = self._list_changes()
+            
+            # 已记录的文件及目录ID和上次的本地路径，用于识别移动、重命名和删除
+            known = self.db_manager.get_drive_files(
+                change['fileId'] for change in changes if change.get('fileId')
+            )
+            
+            files = {}
+            folders = {}
+            parent_ids = []
+            removed_ids = []
+            deleted_paths = []
+            for change in changes:
+                file_id = change.get('fileId')
+                file = change.get('file')
+                if not file_id:
+                    continue
+                
+                is_removed = change.get('removed') or not file or file.get('trashed')
+                known_folder = file_id in known and known[file_id][1] == _FOLDER_ROW_MTIME
+                # 已删除的条目不带元数据，根据目录缓存及数据库中的目录记录判断是否为目录
+                if file:
+                    is_folder = file.get('mimeType') == FOLDER_MIME_TYPE
+                else:
+                    is_folder = known_folder or file_id in self._parent_cache
+                
+                if is_folder:
+                    # 目录变化（重命名、移动或删除）：记录原路径后用变更中的信息更新缓存，
+                    # 原路径优先取数据库中的记录，目录缓存在重启后为空
+                    if file_id not in folders:
+                        folders[file_id] = (
+                            known[file_id][0] if known_folder else self._cached_folder_path(file_id)
+                        )
+                    if is_removed:
+                        self._parent_cache.pop(file_id)
+                        removed_ids.append(file_id)
+                        old_path = folders.pop(file_id)
+                        if old_path:
+                            deleted_paths.extend(
+                                path for path, _, _ in self.db_manager.list_files_under(old_path)
+                            )
+                    elif 'name' in file:
+                        parent_id = file['parents'][0] if file.get('parents') else None
+                        self._parent_cache.put(file_id, (file['name'], parent_id))
+                        if parent_id:
+                            parent_ids.append(parent_id)
                     else:
-                        logger.info(f"新增文件记录: {file_info['path']}")
-
-                    # 更新数据库
-                    self.db_manager.add_file(
-                        file_info['path'],
-                        file_info['size'],
-                        file_info['mtime']
-                    )
-
-                    # 通知文件变化
-                    if self.on_file_change:
-                        self.on_file_change(file_info['path'])
+                        self._parent_cache.pop(file_id)
+                    continue
+                
+                if is_removed:
+                    files.pop(file_id, None)
+                    removed_ids.append(file_id)
+                    if file_id in known:
+                        deleted_paths.append(known[file_id][0])
+                    continue
+                if not file.get('modifiedTime'):
+                    continue
+                # Google文档等在线格式没有可挂载的文件内容，在解析上级目录之前就丢弃
+                if file.get('mimeType', '').startswith(GOOGLE_APPS_MIME_PREFIX):
+                    continue
+                
+                # 修改时间只解析一次，之后以整数时间戳比较
+                files[file_id] = (file, _parse_drive_time(file['modifiedTime']))
+            
+            # 批量获取所有文件及目录的上级目录
+            parent_ids.extend(
+                file['parents'][0] for file, _ in files.values() if file.get('parents')
+            )
+            self._resolve_parents(parent_ids)
+            
+            # 处理每个文件，数据库写入收集后在循环结束时批量提交（按路径去重）
+            file_rows = {}
+            drive_rows = []
+            changed_paths = []
+            for file_id, (file, modified_time) in files.items():
+                # 获取文件信息（上级目录获取失败时抛出异常，本次检查失败且不推进页面令牌）
+                file_info = self._get_file_info(file_id, file, modified_time)
+                cached = known.get(file_id)
+                if not file_info:
+                    # 所有上级目录均已获取且移出了监控范围，按删除处理
+                    if cached:
+                        removed_ids.append(file_id)
+                        deleted_paths.append(cached[0])
+                    continue
+                path = file_info['path']
+                
+                if cached and cached[0] != path:
+                    # 移动或重命名：原路径按删除处理
+                    logger.info(f"文件已移动: {cached[0]} -> {path}")
+                    deleted_paths.append(cached[0])
+                if cached != (path, file_info['mtime']):
+                    drive_rows.append((file_id, path, file_info['mtime']))
+                
+                # 检查文件是否已存在于数据库
+                existing_info = self.db_manager.get_file_info(path)
+                if existing_info:
+                    if existing_info['mtime'] == file_info['mtime']:
+                        logger.debug(f"文件未变化，跳过处理: {path}")
+                        continue
+                    logger.info(f"更新文件记录: {path}")
+                else:
+                    logger.info(f"新增文件记录: {path}")
+                
+                file_rows[path] = (path, file_info['size'], file_info['mtime'], None)
+                changed_paths.append(path)
+            
+            # 目录移动或重命名：其下已记录的文件整体迁移到新路径
+            moved_folders = []
+            for folder_id, old_path in folders.items():
+                if not old_path:
+                    continue
+                new_path = self._cached_folder_path(folder_id, strict=True)
+                if new_path == old_path:
+                    continue
+                logger.info(f"目录已移动: {old_path} -> {new_path}")
+                if new_path:
+                    moved_folders.append((old_path, new_path))
+                else:
+                    removed_ids.append(folder_id)
+                for path, size, mtime in self.db_manager.list_files_under(old_path):
+                    deleted_paths.append(path)
+                    if new_path:
+                        moved_path = new_path + path[len(old_path):]
+                        file_rows[moved_path] = (moved_path, size, mtime, None)
+                        changed_paths.append(moved_path)
+            
+            # 记录本次涉及的目录及其上级目录的路径，供重启后识别目录变化
+            drive_rows.extend(self._folder_rows(
+                [file['parents'][0] for file, _ in files.values() if file.get('parents')] + list(folders)
+            ))
+            
+            # 在同一个事务中更新数据库，整批变更只提交一次；删除的文件记录在通知后再移除
+            with self.db_manager.transaction():
+                self.db_manager.add_files_bulk(file_rows.values())
+                self.db_manager.set_drive_files_bulk(drive_rows)
+                self.db_manager.remove_drive_files_bulk(removed_ids)
+                for old_path, new_path in moved_folders:
+                    self.db_manager.move_drive_paths(old_path, new_path)
+            
+            # 通知本次检查的所有变化，运行中时先经过合并窗口去重
+            changed = set(changed_paths)
+            items = [(path, True) for path in dict.fromkeys(deleted_paths) if path not in changed]
+            items += [(path, False) for path in dict.fromkeys(changed_paths)]
+            if items:
+                if self._debouncer:
+                    for path, is_delete in items:
+                        self._debouncer.enqueue(path, is_delete)
+                else:
+                    self._deliver_changes(items)
 
-            self.last_check_time = datetime.utcnow()
+            # 全部处理完成后才推进页面令牌，失败时下次重新处理这批变更
+            self._page_token = next_page_token
+            self.db_manager.set_sync_state(PAGE_TOKEN_STATE_KEY, next_page_token)
+            return len(changes)
 
         except Exception as e:
             logger.error(f"检查文件变化失败: {e}")
+            return None
+    
+    def _deliver_changes(self, items: List[Tuple[str, bool]]) -> None:
+        """
+        调用文件变化回调及批量变化回调，删除的文件在通知后移除数据库记录
+        （软链接记录随文件记录级联删除，需先让回调查到对应的软链接）
+        
+        Args:
+            items: 变化的(路径, 是否删除)列表
+        """
+        for path, is_delete in items:
+            if self.on_file_change:
+                try:
+                    self.on_file_change(path, is_delete)
+                except Exception as e:
+                    logger.error(f"文件变化通知失败 {path}: {e}")
+        if self.on_batch_change:
+            try:
+                self.on_batch_change(items)
+            except Exception as e:
+                logger.error(f"批量变化通知失败: {e}")
+        
+        deleted = [path for path, is_delete in items if is_delete]
+        if deleted:
+            self.db_manager.remove_files_bulk(deleted)
+            logger.info(f"已删除 {len(deleted)} 个文件记录")
     
     def start(self) -> None:
         """启动监控"""
@@ -276,26 +803,67 @@ class GoogleDriveMonitor:
     
     def stop(self) -> None:
         """停止监控"""
+        self._stop_event.set()
+        if self._fetch_executor:
+            self._fetch_executor.shutdown(wait=True)
+            self._fetch_executor = None
         if self.drive_service:
             self.drive_service.close()
             self.drive_service = None
-        if self.activity_service:
-            self.activity_service.close()
-            self.activity_service = None
         logger.info("Google Drive监控已停止")
     
     def run_forever(self) -> None:
         """持续运行监控"""
         try:
+            self._stop_event.clear()
             self.start()
+            self._debouncer = Debouncer(
+                self._deliver_changes,
+                self.config.gdrive_debounce_ms / 1000,
+                name="GoogleDriveNotify"
+            )
+            self._debouncer.start()
             
-            while True:
+            # 按固定节奏检查：下一次检查时间在上一次计划时间上累加，不受检查耗时影响；
+            # 连续无变化时逐步延长间隔，有变化时恢复，检查失败时按指数退避重试
+            base_interval = self.config.gdrive_polling_interval
+            max_interval = max(base_interval, self.config.gdrive_max_polling_interval)
+            interval = base_interval
+            failures = 0
+            next_tick = time.monotonic()
+            while not self._stop_event.is_set():
                 # 检查文件变化
-                self._check_changes()
-                # 等待下一次检查
-                time.sleep(self.config.gdrive_polling_interval)
+                change_count = self._check_changes()
+                
+                if change_count is None:
+                    failures += 1
+                    retry_delay = min(ERROR_BACKOFF_BASE * 2 ** (failures - 1), ERROR_BACKOFF_MAX, base_interval)
+                    logger.warning(f"Google Drive检查失败，{retry_delay} 秒后重试（连续失败 {failures} 次）")
+                    next_tick = time.monotonic() + retry_delay
+                else:
+                    failures = 0
+                    interval = base_interval if change_count else min(interval * IDLE_BACKOFF_FACTOR, max_interval)
+                    next_tick += interval
+                
+                delay = next_tick - time.monotonic()
+                if delay < 0:
+                    # 检查耗时超过轮询间隔时不补做错过的检查，从当前时间重新计时
+                    logger.warning(f"Google Drive检查耗时超过轮询间隔 {-delay:.1f} 秒")
+                    next_tick = time.monotonic()
+                    delay = 0
+                delay += random.uniform(0, POLL_JITTER_RATIO * delay)
+                
+                # 在空闲时提前刷新下一次检查前将到期的令牌
+                self._refresh_token_if_needed(delay)
+                
+                # 等待下一次检查（附加随机抖动），收到停止信号时立即返回
+                self._stop_event.wait(delay)
                 
         except KeyboardInterrupt:
             logger.info("收到停止信号")
         finally:
+            if self._debouncer:
+                # 立即发出尚在合并窗口中的通知
+                self._debouncer.stop(flush=True)
+                self._debouncer = None
             self.stop() 
\ No newline at end of file
@@ -1,16 +1,43 @@
 import os
-import json
 import time
-import pytz
+from array import array
 import threading
 import concurrent.futures
 from queue import Queue
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterable, Optional, Tuple
 from datetime import datetime, timedelta
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
 from db_manager import DatabaseManager
 from config import Config
 from utils.logging_utils import logger
+from utils import json_utils
+
+# 文件大小单位（每级1024倍）
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+# 模板字节码缓存目录（位于数据库所在目录下）
+TEMPLATE_CACHE_DIR = 'jinja_cache'
+
+# 快照数据指纹在同步状态表中的键前缀（后接输出文件的绝对路径）
+SNAPSHOT_STATE_PREFIX = 'snapshot_fingerprint:'
+
+# 快照输出格式版本（计入数据指纹），修改导出逻辑或输出格式时递增，使已有快照重新生成
+SNAPSHOT_FORMAT_VERSION = 1
+
+# 快照HTML模板文件名
+SNAPSHOT_TEMPLATE = 'snapshot_template.html'
+
+# 一级子目录下的文件数达到该值时，交给进程池并行建树
+PARALLEL_SHARD_MIN_FILES = 20000
+
+# 后台写入时每个数据块的大小（字节）
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+# 后台写入队列中最多等待的数据块数
+WRITE_QUEUE_SIZE = 8
+
+# 本地路径分隔符到正斜杠的转换表（分隔符本身就是正斜杠时为None）
+_SEP_TABLE = str.maketrans(os.sep, '/') if os.sep != '/' else None
 
 class ProgressTracker:
     """进度跟踪器"""
@@ -45,6 +72,162 @@ class ProgressTracker:
             f"速度: {speed:.1f} 项/秒"
         )
 
+
+def _make_dir_data(dir_path: str,
+                   files: List[Tuple[str, int, int]],
+                   size: int,
+                   subdirs: Iterable[int],
+                   now: int) -> List[str]:
+    """
+    生成单个目录的snap2HTML数据
+
+    Args:
+        dir_path: 目录路径
+        files: (文件名, 文件大小, 修改时间) 列表
+        size: 目录总大小（含子目录）
+        subdirs: 子目录ID列表（升序）
+        now: 目录时间戳
+
+    Returns:
+        List[str]: 目录信息 (path*0*mtime)、文件信息、目录总大小、子目录ID列表
+    """
+    files.sort(key=lambda x: x[0].lower())
+    dir_data = [f"{dir_path}*0*{now}"]
+    dir_data.extend(f"{name}*{file_size}*{mtime}" for name, file_size, mtime in files)
+    dir_data.append(str(size))
+    dir_data.append('*'.join(map(str, subdirs)))
+    return dir_data
+
+
+def _build_subtree(root_path: str,
+                   files: List[Tuple[str, int, int]],
+                   now: int) -> Tuple[List[List[str]], int]:
+    """
+    由按路径排序的文件记录构建一棵子树（模块级函数，可在进程池中执行）
+
+    有序记录中每个目录的整棵子树是连续的一段（直接位于目录下的文件可能被其子目录的记录隔开），
+    用一个目录栈即可完成建树：离开一棵子树时该目录出栈，生成数据并把大小累加到父目录，
+    之后父目录的文件继续归入仍在栈中的父目录
+
+    Args:
+        root_path: 子树根目录路径
+        files: 子树下的 (标准化文件路径, 文件大小, 修改时间) 列表，按路径排序
+        now: 目录时间戳
+
+    Returns:
+        Tuple[List[List[str]], int]: (目录数据列表（下标即从0开始的局部目录ID）, 子树总大小)
+    """
+    # 栈元素为 [目录路径, 子路径前缀, 目录ID, 文件列表, 目录大小, 子目录ID数组]
+    # 子目录ID用紧凑的无符号整数数组保存，每项4字节
+    dirs_list: List[Optional[List[str]]] = [None]
+    stack = [[root_path, root_path + '/', 0, [], 0, array('I')]]
+    total_size = 0
+
+    def close_dir() -> None:
+        """弹出栈顶目录，生成其数据"""
+        nonlocal total_size
+        dir_path, _, dir_id, dir_files, size, subdirs = stack.pop()
+        dirs_list[dir_id] = _make_dir_data(dir_path, dir_files, size, subdirs, now)
+        if stack:
+            stack[-1][4] += size
+        else:
+            total_size = size
+
+    for file_path, file_size, file_mtime in files:
+        try:
+            dir_path, _, name = file_path.rpartition('/')
+
+            # 离开已处理完的目录（子树根目录始终是祖先，不会被弹出）
+            while dir_path != stack[-1][0] and not dir_path.startswith(stack[-1][1]):
+                close_dir()
+
+            # 逐级进入新目录，子目录ID按首次出现顺序分配，天然有序
+            while dir_path != stack[-1][0]:
+                parent = stack[-1]
+                end = dir_path.find('/', len(parent[1]))
+                child_path = dir_path if end < 0 else dir_path[:end]
+                child_id = len(dirs_list)
+                dirs_list.append(None)
+                parent[5].append(child_id)
+                stack.append([child_path, child_path + '/', child_id, [], 0, array('I')])
+
+            top = stack[-1]
+            top[3].append((name, file_size, file_mtime))
+            top[4] += file_size
+
+        except Exception as e:
+            logger.error(f"处理文件记录时出错: {e}, 文件: {file_path}")
+            continue
+
+    while stack:
+        close_dir()
+
+    return dirs_list, total_size
+
+class BackgroundWriter:
+    """
+    后台文件写入器：调用方的数据先在内存中攒成大块，再经有界队列交给后台线程写入，
+    生成数据与磁盘写入可以同时进行
+    """
+
+    def __init__(self, path: str):
+        """
+        初始化后台写入器并启动写入线程
+
+        Args:
+            path: 输出文件路径（二进制写入）
+        """
+        self.path = path
+        self._file = open(path, 'wb')
+        self._buffer = bytearray()
+        self._queue: Queue = Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="SnapshotWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, data: bytes) -> None:
+        """
+        写入数据（攒满一块后才交给后台线程）
+
+        Args:
+            data: 字节数据
+        """
+        if self._error is not None:
+            raise self._error
+        self._buffer += data
+        if len(self._buffer) >= WRITE_CHUNK_SIZE:
+            self._queue.put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def close(self) -> None:
+        """写出剩余数据，等待后台线程结束并关闭文件；写入失败时抛出异常"""
+        if self._buffer:
+            self._queue.put(bytes(self._buffer))
+            self._buffer.clear()
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        """后台线程：依次写入队列中的数据块，出错后继续取出剩余数据块以免调用方阻塞"""
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            if self._error is None:
+                try:
+                    self._file.write(chunk)
+                except Exception as e:
+                    self._error = e
+
+    def __enter__(self) -> 'BackgroundWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
 class HtmlExporter:
     """HTML导出器"""
     
@@ -60,20 +243,48 @@ class HtmlExporter:
         self.config = config
         self.max_workers = os.cpu_count() or 4  # 线程池大小
         
-        # 设置Jinja2模板环境
-        template_dir = os.path.join(os.path.dirname(__file__), 'templates')
+        # 设置Jinja2模板环境：模板在进程内不会变化，关闭自动重载，
+        # 编译结果缓存到数据库目录，新进程无需重新解析模板
+        self.template_dir = os.path.join(os.path.dirname(__file__), 'templates')
         self.jinja_env = Environment(
-            loader=FileSystemLoader(template_dir),
-            autoescape=True
+            loader=FileSystemLoader(self.template_dir),
+            autoescape=True,
+            auto_reload=False,
+            bytecode_cache=self._create_bytecode_cache()
         )
+        self._snapshot_template: Optional[Template] = None
+
+    def _create_bytecode_cache(self) -> Optional[FileSystemBytecodeCache]:
+        """
+        创建模板字节码缓存
+
+        Returns:
+            Optional[FileSystemBytecodeCache]: 字节码缓存，缓存目录不可用时返回None
+        """
+        cache_dir = os.path.join(os.path.dirname(self.config.db_path) or '.', TEMPLATE_CACHE_DIR)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            return FileSystemBytecodeCache(cache_dir)
+        except OSError as e:
+            logger.warning(f"创建模板缓存目录失败 {cache_dir}: {e}")
+            return None
+
+    def _get_snapshot_template(self) -> Template:
+        """
+        获取快照模板（首次调用时编译，之后复用）
+
+        Returns:
+            Template: 编译后的快照模板
+        """
+        if self._snapshot_template is None:
+            self._snapshot_template = self.jinja_env.get_template(SNAPSHOT_TEMPLATE)
+        return self._snapshot_template
     
     def _format_size(self, size: int) -> str:
         """格式化文件大小"""
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size < 1024:
-                return f"{size:.1f} {unit}"
-            size /= 1024
-        return f"{size:.1f} PB"
+        # 由二进制位数直接得到单位，无需逐级除以1024
+        index = min(max(int(size).bit_length() - 1, 0) // 10, len(SIZE_UNITS) - 1)
+        return f"{size / (1 << (10 * index)):.1f} {SIZE_UNITS[index]}"
     
     def _format_time(self, timestamp: float) -> str:
         """格式化时间戳"""
@@ -90,7 +301,8 @@ class HtmlExporter:
             str: 标准化后的路径
         """
         # 统一使用正斜杠
-        path = path.replace(os.sep, '/')
+        if _SEP_TABLE is not None:
+            path = path.translate(_SEP_TABLE)
         
         # 移除开头的驱动器号(如 "C:")
         if len(path) > 2 and path[1] == ':':
@@ -103,95 +315,135 @@ class HtmlExporter:
         return path
 
     def _build_directory_data(self) -> List[List[str]]:
-        """构建与snap2HTML兼容的目录数据结构"""
-        # 获取所有文件记录
-        files = self.db_manager.list_all_files()
-        logger.info(f"从数据库获取了 {len(files)} 个文件记录")
-
-        # 初始化数据结构
-        dirs_dict = {}  # 临时字典，用于构建目录结构
-        dirs_list = []  # 最终的目录列表
-        dir_id_map = {}  # 目录路径到ID的映射
-
-        # 初始化根目录
-        root_path = self._normalize_path(self.config.local_root_path)
-        dirs_dict[root_path] = {
-            'id': 0,
-            'files': [],
-            'size': 0,
-            'subdirs': set()
-        }
-        dir_id_map[root_path] = 0
-        next_dir_id = 1
-
-        # 处理所有文件
-        for file in files:
-            try:
-                file_path = self._normalize_path(file['path'])
-                dir_path = os.path.dirname(file_path)
-                file_size = file['size']
-                file_mtime = int(file['modified_time'])
-
-                # 确保目录存在
-                current_path = dir_path
-                while current_path and current_path not in dirs_dict:
-                    parent_path = os.path.dirname(current_path)
-                    dirs_dict[current_path] = {
-                        'id': next_dir_id,
-                        'files': [],
-                        'size': 0,
-                        'subdirs': set()
-                    }
-                    dir_id_map[current_path] = next_dir_id
-                    next_dir_id += 1
-
-                    if parent_path in dirs_dict:
-                        dirs_dict[parent_path]['subdirs'].add(dirs_dict[current_path]['id'])
-
-                    current_path = parent_path
-
-                # 添加文件信息
-                dirs_dict[dir_path]['files'].append({
-                    'name': os.path.basename(file_path),
-                    'size': file_size,
-                    'mtime': file_mtime
-                })
-
-                # 更新目录大小
-                current_path = dir_path
-                while current_path in dirs_dict:
-                    dirs_dict[current_path]['size'] += file_size
-                    current_path = os.path.dirname(current_path)
-
-            except Exception as e:
-                logger.error(f"处理文件记录时出错: {e}, 文件: {file}")
-                continue
-
-        # 转换为snap2HTML格式
-        for dir_path, dir_info in dirs_dict.items():
-            dir_data = []
-            
-            # 添加目录信息 (path*0*mtime)
-            dir_data.append(f"{dir_path}*0*{int(time.time())}")
-            
-            # 添加文件信息
-            for file in sorted(dir_info['files'], key=lambda x: x['name'].lower()):
-                dir_data.append(f"{file['name']}*{file['size']}*{file['mtime']}")
-            
-            # 添加目录总大小
-            dir_data.append(str(dir_info['size']))
-            
-            # 添加子目录ID列表
-            dir_data.append('*'.join(map(str, sorted(dir_info['subdirs']))))
-            
-            # 将目录数据添加到正确的位置
-            dirs_list.append(dir_data)
+        """
+        构建与snap2HTML兼容的目录数据结构
+
+        按路径顺序单次遍历数据库记录：每个目录的整棵子树在有序结果中是连续的一段
+        （直接位于目录下的文件可能被其子目录的记录隔开），
+        因此根目录下每个一级子目录的记录也是连续的一段。每段作为一个分片，
+        较大的分片交给进程池并行建树，最后按顺序拼接并平移目录ID
+
+        Returns:
+            List[List[str]]: 目录数据列表，下标即目录ID（根目录为0）
+        """
+        now = int(time.time())
+        file_count = 0
+
+        root_path = self._normalize_path(self.config.local_root_path).rstrip('/') or '/'
+        root_prefix = root_path if root_path == '/' else root_path + '/'
+        root_files: List[Tuple[str, int, int]] = []
+        shards: List[Any] = []  # 每个分片为 (目录数据列表, 目录大小) 或其 Future
+        shard_path: Optional[str] = None
+        shard_files: List[Tuple[str, int, int]] = []
+        executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+        def flush_shard() -> None:
+            """提交当前分片：小分片直接在本进程中处理"""
+            nonlocal executor
+            if not shard_files:
+                return
+            if len(shard_files) < PARALLEL_SHARD_MIN_FILES:
+                shards.append(_build_subtree(shard_path, shard_files, now))
+                return
+            if executor is None:
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+            shards.append(executor.submit(_build_subtree, shard_path, shard_files, now))
+
+        try:
+            for path, file_size, file_mtime in self.db_manager.iter_files_sorted():
+                file_count += 1
+                try:
+                    # POSIX下数据库中的绝对路径已是标准形式，无需逐条标准化
+                    file_path = path if _SEP_TABLE is None and path.startswith('/') else self._normalize_path(path)
+                    if not file_path.startswith(root_prefix):
+                        logger.warning(f"文件不在本地根目录下，已跳过: {path}")
+                        continue
+
+                    head, sep, name = file_path[len(root_prefix):].partition('/')
+                    if not sep:
+                        root_files.append((head, file_size, int(file_mtime)))
+                        continue
+
+                    child_path = root_prefix + head
+                    if child_path != shard_path:
+                        flush_shard()
+                        shard_path = child_path
+                        shard_files = []
+                    shard_files.append((file_path, file_size, int(file_mtime)))
+
+                except Exception as e:
+                    logger.error(f"处理文件记录时出错: {e}, 文件: {path}")
+                    continue
+
+            flush_shard()
+
+            # 拼接分片：每个分片的目录ID整体平移到其在结果中的位置
+            dirs_list: List[List[str]] = [[]]
+            root_subdirs = array('I')
+            root_size = sum(file[1] for file in root_files)
+            for shard in shards:
+                shard_dirs, shard_size = shard.result() if isinstance(shard, concurrent.futures.Future) else shard
+                offset = len(dirs_list)
+                for dir_data in shard_dirs:
+                    if dir_data[-1]:
+                        dir_data[-1] = '*'.join(str(int(dir_id) + offset) for dir_id in dir_data[-1].split('*'))
+                dirs_list.extend(shard_dirs)
+                root_subdirs.append(offset)
+                root_size += shard_size
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        dirs_list[0] = _make_dir_data(root_path, root_files, root_size, root_subdirs, now)
+
+        logger.info(f"从数据库获取了 {file_count} 个文件记录")
 
         return dirs_list
 
+    def _snapshot_fingerprint(self, output_path: str,
+                              template_name: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """
+        计算快照的数据指纹，并判断输出文件是否已是最新
+
+        指纹包含输出格式版本和模板文件的修改时间，导出逻辑或模板变化后即使文件记录不变也会重新生成
+
+        Args:
+            output_path: 输出文件路径
+            template_name: 生成快照使用的模板文件名（可选）
+
+        Returns:
+            Tuple[str, Optional[str]]: (同步状态键, 当前指纹)；输出文件已是最新时指纹为None
+        """
+        key = SNAPSHOT_STATE_PREFIX + os.path.abspath(output_path)
+        files_fingerprint = self.db_manager.get_files_fingerprint()
+        if files_fingerprint is None:
+            return key, ''
+
+        template_stamp = ''
+        if template_name:
+            try:
+                st = os.stat(os.path.join(self.template_dir, template_name))
+                template_stamp = f"{st.st_mtime_ns}-{st.st_size}"
+            except OSError:
+                return key, ''
+
+        fingerprint = (
+            f"v{SNAPSHOT_FORMAT_VERSION}|{template_stamp}|"
+            f"{self.config.local_root_path}|{files_fingerprint}"
+        )
+        if os.path.exists(output_path) and self.db_manager.get_sync_state(key) == fingerprint:
+            return key, None
+        return key, fingerprint
+
     def generate_snapshot(self, output_path: str) -> bool:
         """生成HTML快照"""
         try:
+            # 文件记录自上次生成后没有变化时，直接沿用已有快照
+            state_key, fingerprint = self._snapshot_fingerprint(output_path, SNAPSHOT_TEMPLATE)
+            if fingerprint is None:
+                logger.info(f"文件记录无变化，跳过HTML快照生成: {output_path}")
+                return True
+
             logger.info("开始生成HTML快照...")
             start_time = time.time()
 
@@ -203,27 +455,28 @@ class HtmlExporter:
             total_dirs = len(dirs_data)
             total_size = sum(int(d[-2]) for d in dirs_data)  # -2 index is the total size
 
-            # 生成JavaScript数据
-            js_data = []
-            for dir_data in dirs_data:
-                js_data.append(f"D.p({json.dumps(dir_data)})")
-
-            # 使用模板生成HTML
-            template = self.jinja_env.get_template('snapshot_template.html')
-            html_content = template.render(
-                directory_data='\n'.join(js_data),
-                total_files=total_files,
-                total_dirs=total_dirs,
-                total_size=total_size,
-                generated_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            # 生成JavaScript数据（渲染时逐行生成，不预先拼接）
+            js_data = (
+                f"D.p({json_utils.dumps(dir_data).decode('utf-8')})"
+                for dir_data in dirs_data
             )
 
             # 确保输出目录存在
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-            # 写入文件
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            # 使用模板流式生成HTML，由后台线程分块写入文件，不在内存中保留整个文档
+            template = self._get_snapshot_template()
+            with BackgroundWriter(output_path) as f:
+                template.stream(
+                    directory_data=js_data,
+                    total_files=total_files,
+                    total_dirs=total_dirs,
+                    total_size=total_size,
+                    generated_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                ).dump(f, encoding='utf-8')
+
+            if fingerprint:
+                self.db_manager.set_sync_state(state_key, fingerprint)
 
             elapsed_time = time.time() - start_time
             logger.info(f"HTML快照生成完成:")
@@ -247,24 +500,33 @@ class HtmlExporter:
     def export_json(self, output_path: str) -> bool:
         """导出JSON格式的快照"""
         try:
+            # 文件记录自上次生成后没有变化时，直接沿用已有快照
+            state_key, fingerprint = self._snapshot_fingerprint(output_path)
+            if fingerprint is None:
+                logger.info(f"文件记录无变化，跳过JSON快照生成: {output_path}")
+                return True
+
             logger.info("开始生成JSON快照...")
             start_time = time.time()
 
             # 使用相同的数据结构
             dirs_data = self._build_directory_data()
 
-            # 转换为JSON格式
-            data = {
-                'generated_at': datetime.now().isoformat(),
-                'dirs': dirs_data
-            }
-
             # 确保输出目录存在
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-            # 保存JSON文件
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            # 逐个目录序列化写入，不在内存中拼接整个JSON文档
+            with BackgroundWriter(output_path) as f:
+                f.write(b'{\n  "generated_at": ')
+                f.write(json_utils.dumps(datetime.now().isoformat()))
+                f.write(b',\n  "dirs": [')
+                for index, dir_data in enumerate(dirs_data):
+                    f.write(b',\n    ' if index else b'\n    ')
+                    f.write(json_utils.dumps(dir_data))
+                f.write(b'\n  ]\n}\n' if dirs_data else b']\n}\n')
+
+            if fingerprint:
+                self.db_manager.set_sync_state(state_key, fingerprint)
 
             elapsed_time = time.time() - start_time
             logger.info(f"JSON快照生成完成:")
@@ -1,13 +1,152 @@
 import os
+import errno
+import logging
+import queue
+import stat as stat_module
+import threading
 import time
-from typing import Optional, Callable, List, Dict
+from collections import defaultdict
+from typing import Optional, Callable, List, Dict, Iterator, Any, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileModifiedEvent, FileDeletedEvent
+from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileModifiedEvent, FileDeletedEvent, FileMovedEvent
 from utils.logging_utils import logger
+from utils.debounce_utils import Debouncer
 from db_manager import DatabaseManager
 from config import Config
-from datetime import datetime
+
+# 并行遍历时结果队列中最多缓存的目录数
+WALK_QUEUE_SIZE = 64
+
+# 单个目录的文件数超过该值时，stat 预取按此大小分片交给多个工作线程并发执行
+STAT_CHUNK_SIZE = 256
+
+# 进度日志中处理速度的平滑系数（指数移动平均，越大越偏向最近一个间隔）
+PROGRESS_RATE_ALPHA = 0.3
+
+# 缓存已记录修改时间的扩展属性名，值为"修改时间|路径"，文件被移动或复制后不会误判为未变化
+XATTR_MTIME_KEY = 'user.graylink.mtime'
+
+def _iter_file_entries(directory: str, workers: int = 1,
+                       ignore: Optional[Callable[[str], bool]] = None) -> Iterator[os.DirEntry]:
+    """
+    用 os.scandir 并行遍历目录树，逐个返回文件条目（不进入指向目录的软链接）
+    
+    每个目录作为独立任务交给工作线程读取，网络挂载上多个目录读取可以同时进行；
+    工作线程同时预取文件条目的 stat()（DirEntry 会缓存结果），调用方再取时无需系统调用；
+    文件很多的目录会把 stat 预取分片放回任务队列，由多个线程并发完成。
+    读取结果经有界队列按目录交给调用方，内存占用与目录树大小无关
+    
+    Args:
+        directory: 根目录
+        workers: 工作线程数
+        ignore: 按名称判断是否忽略的函数（可选），被忽略的目录不再进入读取
+        
+    Returns:
+        Iterator[os.DirEntry]: 文件条目迭代器（目录之间的顺序不固定）
+    """
+    dir_queue: queue.Queue = queue.Queue()
+    out_queue: queue.Queue = queue.Queue(maxsize=WALK_QUEUE_SIZE)
+    stop_event = threading.Event()
+    lock = threading.Lock()
+    pending = 1  # 已入队但尚未读取完成的目录数
+    
+    def put_result(item: Any) -> None:
+        """放入结果队列，调用方提前结束遍历时放弃"""
+        while not stop_event.is_set():
+            try:
+                out_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+    
+    def prefetch_stat(entries: List[os.DirEntry]) -> None:
+        """预取一组文件条目的 stat()"""
+        for entry in entries:
+            try:
+                entry.stat()
+            except OSError:
+                pass  # 由调用方再次获取时记录错误
+    
+    def worker() -> None:
+        """工作线程：读取目录，子目录和 stat 分片放回任务队列，文件条目放入结果队列"""
+        nonlocal pending
+        while True:
+            current = dir_queue.get()
+            if current is None:
+                return
+            
+            # 大目录拆分出的 stat 预取分片
+            if isinstance(current, list):
+                prefetch_stat(current)
+                put_result(current)
+                with lock:
+                    pending -= 1
+                    finished = pending == 0
+                if finished:
+                    put_result(None)
+                continue
+            
+            entries = []
+            subdirs = []
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if ignore is not None and ignore(entry.name):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                            elif not entry.is_dir():
+                                entries.append(entry)
+                        except OSError as e:
+                            logger.error(f"读取目录条目失败 {entry.path}: {e}")
+            except OSError as e:
+                logger.error(f"读取目录失败 {current}: {e}")
+            
+            # 当前线程只预取第一个分片，其余分片与子目录一起放回任务队列
+            chunks = []
+            if workers > 1 and len(entries) > STAT_CHUNK_SIZE:
+                chunks = [
+                    entries[start:start + STAT_CHUNK_SIZE]
+                    for start in range(STAT_CHUNK_SIZE, len(entries), STAT_CHUNK_SIZE)
+                ]
+                entries = entries[:STAT_CHUNK_SIZE]
+            
+            # 先登记子目录和分片再完成当前目录，计数归零时整棵树已读取完毕
+            with lock:
+                pending += len(subdirs) + len(chunks)
+            for subdir in subdirs:
+                dir_queue.put(subdir)
+            for chunk in chunks:
+                dir_queue.put(chunk)
+            if entries:
+                prefetch_stat(entries)
+                put_result(entries)
+            with lock:
+                pending -= 1
+                finished = pending == 0
+            if finished:
+                put_result(None)
+    
+    dir_queue.put(directory)
+    threads = [
+        threading.Thread(target=worker, name=f"ScanWorker-{index}", daemon=True)
+        for index in range(max(1, workers))
+    ]
+    for thread in threads:
+        thread.start()
+    
+    try:
+        while True:
+            entries = out_queue.get()
+            if entries is None:
+                break
+            yield from entries
+    finally:
+        stop_event.set()
+        for _ in threads:
+            dir_queue.put(None)
 
 class FileEventHandler(FileSystemEventHandler):
     """文件事件处理器"""
@@ -25,92 +164,370 @@ class FileEventHandler(FileSystemEventHandler):
         self.db_manager = db_manager
         self.config = config
         self.on_file_change = on_file_change
+        
+        # 挂载点 -> (是否可用, 检查时间)，在 mount_status_ttl 内复用检查结果
+        self._mount_status: Dict[str, Tuple[bool, float]] = {}
+        
+        # 挂载点暂时不可用时延后的删除操作：挂载点 -> 文件路径列表，由后台线程定期重试，
+        # 避免在事件线程中等待重试而阻塞后续事件
+        self._pending_deletes: Dict[str, List[str]] = defaultdict(list)
+        self._pending_delete_attempts: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._reaper_stop = threading.Event()
+        
+        # 创建/修改事件的合并器（start() 后生效），正在写入的文件连续产生的事件只处理一次
+        self._debouncer: Optional[Debouncer] = None
+        
+        # 文件系统不支持扩展属性时在首次写入失败后关闭
+        self._xattr_enabled = config.xattr_cache_enabled and hasattr(os, 'setxattr')
+    
+    def _xattr_value(self, path: str, mtime: float) -> bytes:
+        """生成扩展属性中缓存的值"""
+        return f"{mtime!r}|".encode() + os.fsencode(path)
     
-    def _is_mount_point_available(self, path: str) -> bool:
+    def _xattr_unchanged(self, path: str, mtime: float) -> bool:
+        """
+        根据扩展属性判断文件是否未变化，无需查询数据库
+        
+        Args:
+            path: 文件路径
+            mtime: 当前修改时间
+            
+        Returns:
+            bool: 扩展属性记录的修改时间与当前一致时返回True
+        """
+        if not self._xattr_enabled:
+            return False
+        try:
+            return os.getxattr(path, XATTR_MTIME_KEY) == self._xattr_value(path, mtime)
+        except OSError:
+            return False
+    
+    def _xattr_store(self, path: str, mtime: float) -> None:
+        """
+        将已记录的修改时间写入文件扩展属性
+        
+        Args:
+            path: 文件路径
+            mtime: 已写入数据库的修改时间
+        """
+        if not self._xattr_enabled:
+            return
+        try:
+            os.setxattr(path, XATTR_MTIME_KEY, self._xattr_value(path, mtime))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            if e.errno in (errno.ENOTSUP, errno.EOPNOTSUPP, errno.EPERM, errno.EACCES):
+                self._xattr_enabled = False
+                logger.warning(f"文件系统不支持扩展属性缓存，已关闭: {e}")
+            else:
+                logger.debug(f"写入扩展属性失败 {path}: {e}")
+    
+    def _is_mount_point_available(self, path: str, retry: bool = True) -> bool:
         """
         检查文件所在的挂载点是否可用
         
         Args:
             path: 文件路径
+            retry: 不可用时是否按配置等待重试（事件线程中只检查一次）
             
         Returns:
             bool: 挂载点是否可用
         """
-        # 检查文件所在的挂载点
-        for mount_point in self.config.mount_points:
-            if path.startswith(mount_point):
+        # 查找文件所在的挂载点（最长前缀匹配）
+        mount_point = self.config.find_mount_point(path)
+        if mount_point is None:
+            return False
+        
+        # 短时间内重复检查同一挂载点时直接使用上次的结果
+        cached = self._mount_status.get(mount_point)
+        if cached and time.monotonic() - cached[1] < self.config.mount_status_ttl:
+            return cached[0]
+        
+        try:
+            # 尝试多次检查挂载点状态
+            retry_count = self.config.mount_retry_count if retry else 0
+            for attempt in range(retry_count + 1):
+                if os.path.ismount(mount_point):
+                    if attempt > 0:
+                        logger.info(f"挂载点恢复可用: {mount_point}")
+                    self._mount_status[mount_point] = (True, time.monotonic())
+                    return True
+                
+                if attempt < retry_count:
+                    logger.warning(f"挂载点不可用，等待重试 ({attempt + 1}/{retry_count}): {mount_point}")
+                    time.sleep(self.config.mount_retry_delay)
+            
+            # 所有重试都失败
+            if retry:
+                logger.error(f"挂载点不可用，已达到最大重试次数: {mount_point}")
+            self._mount_status[mount_point] = (False, time.monotonic())
+            return False
+            
+        except Exception as e:
+            logger.error(f"检查挂载点状态失败 {mount_point}: {e}")
+            return False
+    
+    def _defer_delete(self, path: str) -> None:
+        """
+        挂载点不可用时将删除操作交给后台线程重试
+        
+        Args:
+            path: 被删除的文件路径
+        """
+        mount_point = self.config.find_mount_point(path)
+        if mount_point is None or self.config.mount_retry_count == 0:
+            logger.warning(f"挂载点不可用，跳过删除操作: {path}")
+            return
+        
+        with self._pending_lock:
+            self._pending_deletes[mount_point].append(path)
+            self._pending_delete_attempts.setdefault(mount_point, 0)
+            if self._reaper is None:
+                self._reaper_stop.clear()
+                self._reaper = threading.Thread(
+                    target=self._reap_pending_deletes, name="PendingDeleteReaper", daemon=True
+                )
+                self._reaper.start()
+        logger.warning(f"挂载点不可用，删除操作延后重试: {path}")
+    
+    def _reap_pending_deletes(self) -> None:
+        """后台线程：每隔 mount_retry_delay 秒检查一次挂载点，恢复后执行延后的删除操作"""
+        while not self._reaper_stop.wait(self.config.mount_retry_delay):
+            with self._pending_lock:
+                mount_points = list(self._pending_deletes)
+            
+            for mount_point in mount_points:
                 try:
-                    # 尝试多次检查挂载点状态
-                    for attempt in range(self.config.mount_retry_count + 1):
-                        if os.path.ismount(mount_point):
-                            if attempt > 0:
-                                logger.info(f"挂载点恢复可用: {mount_point}")
-                            return True
-                        
-                        if attempt < self.config.mount_retry_count:
-                            logger.warning(f"挂载点不可用，等待重试 ({attempt + 1}/{self.config.mount_retry_count}): {mount_point}")
-                            time.sleep(self.config.mount_retry_delay)
-                    
-                    # 所有重试都失败
-                    logger.error(f"挂载点不可用，已达到最大重试次数: {mount_point}")
-                    return False
-                    
+                    available = os.path.ismount(mount_point)
                 except Exception as e:
                     logger.error(f"检查挂载点状态失败 {mount_point}: {e}")
-                    return False
+                    available = False
+                
+                with self._pending_lock:
+                    if available:
+                        paths = self._pending_deletes.pop(mount_point, [])
+                        self._pending_delete_attempts.pop(mount_point, None)
+                        self._mount_status[mount_point] = (True, time.monotonic())
+                    else:
+                        attempts = self._pending_delete_attempts.get(mount_point, 0) + 1
+                        self._pending_delete_attempts[mount_point] = attempts
+                        if attempts < self.config.mount_retry_count:
+                            logger.warning(f"挂载点不可用，等待重试 ({attempts}/{self.config.mount_retry_count}): {mount_point}")
+                            continue
+                        dropped = self._pending_deletes.pop(mount_point, [])
+                        self._pending_delete_attempts.pop(mount_point, None)
+                        logger.error(f"挂载点不可用，已达到最大重试次数，放弃 {len(dropped)} 个删除操作: {mount_point}")
+                        continue
+                
+                logger.info(f"挂载点恢复可用，执行 {len(paths)} 个延后的删除操作: {mount_point}")
+                for path in paths:
+                    self._process_file(path, is_delete=True)
+            
+            with self._pending_lock:
+                if not self._pending_deletes:
+                    self._reaper = None
+                    return
+    
+    def start(self) -> None:
+        """启动事件合并器（合并窗口为0时不合并，事件直接处理）"""
+        if self.config.local_debounce_ms > 0 and self._debouncer is None:
+            self._debouncer = Debouncer(
+                self._process_debounced,
+                self.config.local_debounce_ms / 1000,
+                name="LocalEventDebouncer"
+            )
+            self._debouncer.start()
+    
+    def _process_debounced(self, items: List[Tuple[str, Any]]) -> None:
+        """
+        处理合并窗口到期的一批文件：一次查询取出已有记录，有变化的文件在一个事务中写入，
+        再逐个通知文件变化（只有一个文件时按普通流程处理）
+        
+        合并器线程是创建/修改事件唯一的写入方，事件线程只负责提交
+        
+        Args:
+            items: 到期的(文件路径, 无用值)列表
+        """
+        if len(items) == 1:
+            self._process_file(items[0][0])
+            return
+        
+        files = []
+        for path, _ in items:
+            if self._is_ignored(path):
+                continue
+            try:
+                files.append((path, os.stat(path)))
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.error(f"获取文件信息失败 {path}: {e}")
+        
+        changed = self._apply_file_rows(files)
+        if not changed:
+            return
+        
+        # 通知软链接管理器处理更新
+        if self.on_file_change:
+            for path, _ in changed:
+                try:
+                    self.on_file_change(path, False)
+                except Exception as e:
+                    logger.error(f"处理文件失败 {path}: {e}")
+    
+    def _apply_file_rows(self, files: List[Tuple[str, os.stat_result]],
+                         log_level: int = logging.INFO) -> Optional[List[Tuple[str, bool]]]:
+        """
+        批量记录一组文件的变化：扩展属性或数据库中修改时间未变的文件跳过，
+        有变化的文件在一个事务中写入，不调用文件变化回调（由调用方决定如何通知）
+        
+        Args:
+            files: (文件路径, 文件状态) 列表，非普通文件会被忽略
+            log_level: 逐个文件的新增/更新日志级别
+            
+        Returns:
+            Optional[List[Tuple[str, bool]]]: 已写入的(文件路径, 是否为更新)列表；
+            查询或写入数据库失败时返回None
+        """
+        is_reg = stat_module.S_ISREG
+        debug = logger.isEnabledFor(logging.DEBUG)
+        verbose = logger.isEnabledFor(log_level)
+        rows = []
+        for path, stat in files:
+            if not is_reg(stat.st_mode):
+                continue
+            if self._xattr_unchanged(path, stat.st_mtime):
+                if debug:
+                    logger.debug(f"文件未变化，跳过处理: {path}")
+                continue
+            rows.append((path, stat.st_size, stat.st_mtime, None))
+        if not rows:
+            return []
+        
+        try:
+            existing = self.db_manager.get_file_infos(row[0] for row in rows)
+            changed = []
+            for row in rows:
+                cached = existing.get(row[0])
+                if cached and cached[1] == int(row[2]):
+                    if debug:
+                        logger.debug(f"文件未变化，跳过处理: {row[0]}")
+                    self._xattr_store(row[0], row[2])
+                    continue
+                if verbose:
+                    logger.log(log_level, f"{'更新' if cached else '新增'}文件记录: {row[0]}")
+                changed.append((row, cached is not None))
+            
+            if changed and not self.db_manager.add_files_bulk([row for row, _ in changed]):
+                logger.error(f"批量写入文件记录失败（{len(changed)} 条）")
+                return None
+        except Exception as e:
+            logger.error(f"批量处理文件失败（{len(rows)} 个）: {e}")
+            return None
         
-        return False
+        for row, _ in changed:
+            self._xattr_store(row[0], row[2])
+        return [(row[0], updated) for row, updated in changed]
     
-    def _process_file(self, path: str, is_delete: bool = False) -> None:
+    def stop(self) -> None:
+        """
+        停止后台线程：立即处理尚在合并窗口中的事件，
+        延后的删除操作将被丢弃
+        """
+        if self._debouncer:
+            self._debouncer.stop(flush=True)
+            self._debouncer = None
+        
+        with self._pending_lock:
+            reaper = self._reaper
+            self._reaper = None
+            self._reaper_stop.set()
+            if self._pending_deletes:
+                logger.warning(f"停止监控，丢弃 {sum(len(paths) for paths in self._pending_deletes.values())} 个延后的删除操作")
+            self._pending_deletes.clear()
+            self._pending_delete_attempts.clear()
+        if reaper is not None:
+            reaper.join()
+    
+    def _is_ignored(self, path: str) -> bool:
+        """
+        判断路径的文件名或任一上级目录名是否匹配忽略模式
+        
+        Args:
+            path: 文件路径
+            
+        Returns:
+            bool: 是否忽略
+        """
+        match_ignore = self.config.match_ignore
+        return any(match_ignore(name) for name in path.split(os.sep) if name)
+    
+    def _process_file(self, path: str, stat_result: Optional[os.stat_result] = None,
+                      is_delete: bool = False) -> None:
         """
         处理文件变化
         
         Args:
             path: 文件路径
+            stat_result: 已获取的文件状态（可选，未提供时重新获取）
             is_delete: 是否是删除操作
         """
         try:
+            # 临时文件或位于忽略目录下的文件不做任何处理
+            if self._is_ignored(path):
+                return
+            
             # 只在删除操作时检查挂载点状态
             if is_delete:
-                # 如果挂载点不可用，跳过删除操作
-                if not self._is_mount_point_available(path):
-                    logger.warning(f"挂载点不可用，跳过删除操作: {path}")
+                # 如果挂载点不可用，交给后台线程稍后重试，不阻塞事件线程
+                if not self._is_mount_point_available(path, retry=False):
+                    self._defer_delete(path)
                     return
                 
-                # 1. 删除数据库记录
-                if self.db_manager.remove_file(path):
-                    logger.info(f"删除文件记录: {path}")
-                    # 2. 通知软链接管理器处理删除
+                if self.db_manager.get_file_info(path):
+                    # 1. 通知软链接管理器处理删除（删除文件记录会级联删除软链接记录，需先处理）
                     if self.on_file_change:
                         self.on_file_change(path, True)
+                    # 2. 删除数据库记录
+                    if self.db_manager.remove_file(path):
+                        logger.info(f"删除文件记录: {path}")
             else:
-                if not os.path.isfile(path):
-                    return
-                
                 try:
-                    # 获取文件信息
-                    stat = os.stat(path)
-                    mtime = stat.st_mtime if hasattr(stat, 'st_mtime') else time.time()
-                    size = stat.st_size if hasattr(stat, 'st_size') else 0
+                    # 获取文件信息（扫描时复用目录遍历得到的状态，不再重复stat）
+                    stat = stat_result
+                    if stat is None:
+                        try:
+                            stat = os.stat(path)
+                        except FileNotFoundError:
+                            return
+                    if not stat_module.S_ISREG(stat.st_mode):
+                        return
+                    mtime = stat.st_mtime
                     
-                    file_info = {
-                        'path': path,
-                        'size': size,
-                        'mtime': mtime
-                    }
+                    # 扩展属性中的修改时间一致时直接跳过，不查询数据库
+                    if self._xattr_unchanged(path, mtime):
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(f"文件未变化，跳过处理: {path}")
+                        return
                     
                     # 检查文件是否已存在于数据库
                     existing_info = self.db_manager.get_file_info(path)
                     if existing_info and existing_info.get('mtime'):
-                        if existing_info.get('mtime') == file_info['mtime']:
-                            logger.debug(f"文件未变化，跳过处理: {path}")
+                        if existing_info.get('mtime') == int(mtime):
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug(f"文件未变化，跳过处理: {path}")
+                            self._xattr_store(path, mtime)
                             return
                         logger.info(f"更新文件记录: {path}")
                     else:
                         logger.info(f"新增文件记录: {path}")
                     
                     # 1. 更新数据库
-                    self.db_manager.add_file(file_info['path'], file_info['size'], file_info['mtime'])
+                    if self.db_manager.add_file(path, stat.st_size, mtime):
+                        self._xattr_store(path, mtime)
                     
                     # 2. 通知软链接管理器处理更新
                     if self.on_file_change:
@@ -124,20 +541,45 @@ class FileEventHandler(FileSystemEventHandler):
         except Exception as e:
             logger.error(f"处理文件失败 {path}: {e}")
     
+    def _schedule_update(self, path: str) -> None:
+        """
+        提交文件更新：启用合并器时等窗口内不再有新事件后处理，否则立即处理
+        
+        Args:
+            path: 文件路径
+        """
+        debouncer = self._debouncer
+        if debouncer is not None:
+            debouncer.enqueue(path)
+        else:
+            self._process_file(path, is_delete=False)
+    
     def on_created(self, event: FileCreatedEvent) -> None:
         """处理文件创建事件"""
         if not event.is_directory:
-            self._process_file(event.src_path, is_delete=False)
+            self._schedule_update(event.src_path)
     
     def on_modified(self, event: FileModifiedEvent) -> None:
-        """处理文件修改事件"""
+        """处理文件修改事件（写入过程中的连续修改事件在合并窗口内只处理一次）"""
         if not event.is_directory:
-            self._process_file(event.src_path, is_delete=False)
+            self._schedule_update(event.src_path)
     
     def on_deleted(self, event: FileDeletedEvent) -> None:
-        """处理文件删除事件"""
+        """处理文件删除事件（目录被删除或移出监控范围时，其下已记录的文件按删除处理）"""
         if not event.is_directory:
             self._process_file(event.src_path, is_delete=True)
+            return
+        for path, _, _ in self.db_manager.list_files_under(event.src_path):
+            self._process_file(path, is_delete=True)
+    
+    def on_moved(self, event: FileMovedEvent) -> None:
+        """
+        处理文件移动/重命名事件：原路径按删除处理，新路径按新增处理
+        （目录移动时 watchdog 会为其下每个文件单独产生移动事件）
+        """
+        if not event.is_directory:
+            self._process_file(event.src_path, is_delete=True)
+            self._process_file(event.dest_path, is_delete=False)
 
 class LocalMonitor:
     """本地文件监控器"""
@@ -182,8 +624,8 @@ class LocalMonitor:
         # 为每个监控目录创建观察者
         for monitor_path in self.config.monitor_paths:
             # 检查监控目录所在的挂载点是否可用
-            mount_point = next((mp for mp in available_mount_points if monitor_path.startswith(mp)), None)
-            if mount_point and os.path.exists(monitor_path):
+            mount_point = self.config.find_mount_point(monitor_path)
+            if mount_point in available_mount_points and os.path.exists(monitor_path):
                 self.observer.schedule(self.event_handler, monitor_path, recursive=True)
                 logger.info(f"添加监控目录: {monitor_path}")
             else:
@@ -191,17 +633,20 @@ class LocalMonitor:
     
     def _reset_stats(self) -> None:
         """重置统计信息"""
-        self.total_files = 0  # 总文件数
+        self.total_files = 0  # 已加入处理队列的文件数（边遍历边增加）
         self.processed_files = 0  # 已处理文件数
         self.skipped_files = 0  # 跳过的文件数
+        self.added_files = 0  # 新增的文件数
+        self.updated_files = 0  # 更新的文件数
         self.error_files = 0  # 错误文件数
         self.start_time = time.time()  # 开始时间
         self.last_progress_time = time.time()  # 上次进度更新时间
         self.last_processed_files = 0  # 上次已处理文件数
+        self.processing_rate = 0.0  # 平滑后的处理速度（文件/秒）
     
     def _log_progress(self, force: bool = False) -> None:
         """
-        记录处理进度
+        记录处理进度（单次遍历时总文件数未知，只输出已处理数量和平滑后的速度）
         
         Args:
             force: 是否强制记录，不考虑时间间隔
@@ -211,41 +656,58 @@ class LocalMonitor:
         
         # 使用配置中的进度日志更新间隔
         if force or (current_time - self.last_progress_time) >= self.config.progress_interval:
-            # 计算处理速度（每秒处理文件数）
+            # 计算本间隔的处理速度（每秒处理文件数），并做指数平滑
             interval = current_time - self.last_progress_time
             files_in_interval = self.processed_files - self.last_processed_files
-            speed = files_in_interval / interval if interval > 0 else 0
-            
-            # 计算预计剩余时间
-            remaining_files = self.total_files - self.processed_files
-            eta = remaining_files / speed if speed > 0 else 0
+            if interval > 0:
+                speed = files_in_interval / interval
+                if self.last_processed_files == 0:
+                    self.processing_rate = speed
+                else:
+                    self.processing_rate += PROGRESS_RATE_ALPHA * (speed - self.processing_rate)
             
             # 更新统计信息
             self.last_progress_time = current_time
             self.last_processed_files = self.processed_files
             
             # 记录进度日志
-            progress = (self.processed_files / self.total_files * 100) if self.total_files > 0 else 0
+            scanned = self.total_files + self.skipped_files + self.error_files
             logger.info(
-                f"扫描进度: {progress:.1f}% "
-                f"({self.processed_files}/{self.total_files}) "
-                f"速度: {speed:.1f} 文件/秒 "
-                f"预计剩余时间: {eta:.0f}秒 "
+                f"扫描进度: 已遍历 {scanned} "
+                f"已处理 {self.processed_files}/{self.total_files} "
+                f"速度: {self.processing_rate:.1f} 文件/秒 "
+                f"新增: {self.added_files} "
+                f"更新: {self.updated_files} "
                 f"跳过: {self.skipped_files} "
                 f"错误: {self.error_files}"
             )
     
-    def _process_files_batch(self, files: List[Dict[str, str]]) -> None:
+    def _process_files_batch(self, files: List[Tuple[str, os.stat_result]]) -> None:
         """
-        并行处理一批文件
+        处理一批扫描到的文件：一次查询取出已有记录，只把有变化的文件在一个事务中写入，
+        再并行通知文件变化
         
         Args:
-            files: 文件信息列表，每个文件包含 path 和 mtime
+            files: (文件路径, 扫描时获取的文件状态) 列表
         """
+        # 与事件合并器共用同一套对比和写入流程，逐个文件的日志只在DEBUG级别输出，
+        # 新增/更新数量汇总到扫描完成日志
+        changed = self.event_handler._apply_file_rows(files, log_level=logging.DEBUG)
+        if changed is None:
+            self.error_files += len(files)
+            return
+        for _, updated in changed:
+            if updated:
+                self.updated_files += 1
+            else:
+                self.added_files += 1
+        
+        # 并行通知软链接管理器处理更新
         futures = []
-        for file_info in files:
-            future = self.executor.submit(self.event_handler._process_file, file_info['path'])
-            futures.append(future)
+        if self.on_file_change:
+            for path, _ in changed:
+                futures.append(self.executor.submit(self.on_file_change, path, False))
+        self.processed_files += len(files) - len(futures)
         
         # 等待所有任务完成
         for future in as_completed(futures):
@@ -258,6 +720,7 @@ class LocalMonitor:
             
             # 更新进度
             self._log_progress()
+        self._log_progress()
     
     def _scan_files(self) -> None:
         """扫描所有监控目录下的文件变化"""
@@ -278,58 +741,52 @@ class LocalMonitor:
                 else:
                     logger.info(f"开始首次扫描目录: {monitor_path}")
                 
-                # 首先统计需要处理的文件总数
-                logger.info(f"正在统计文件数量...")
-                for root, _, files in os.walk(monitor_path):
-                    for filename in files:
-                        file_path = os.path.join(root, filename)
-                        try:
-                            stat = os.stat(file_path)
-                            mtime = datetime.fromtimestamp(stat.st_mtime)
-                            if last_scan_time and mtime <= last_scan_time:
-                                self.skipped_files += 1
-                            else:
-                                self.total_files += 1
-                        except Exception:
-                            continue
-                
-                logger.info(f"找到 {self.total_files} 个文件需要处理，{self.skipped_files} 个文件将跳过")
+                # 一次性载入该目录下已记录文件的修改时间，遍历时在内存中对比，
+                # 未变化的文件不进入处理流程，也不需要查询数据库
+                known_mtimes = self.db_manager.load_mtimes(monitor_path)
+                logger.info(f"已载入 {len(known_mtimes)} 条文件记录")
                 
                 # 收集需要处理的文件
                 files_to_process = []
                 
-                # 遍历目录
-                for root, _, files in os.walk(monitor_path):
-                    for filename in files:
-                        file_path = os.path.join(root, filename)
-                        try:
-                            # 获取文件状态
-                            stat = os.stat(file_path)
-                            mtime = datetime.fromtimestamp(stat.st_mtime)
-                            
-                            # 如果有上次扫描记录，且文件未修改，则跳过
-                            if last_scan_time and mtime <= last_scan_time:
-                                continue
-                            
-                            # 添加到待处理列表
-                            files_to_process.append({
-                                'path': file_path,
-                                'mtime': mtime.isoformat()
-                            })
-                            
-                            # 当收集到足够的文件时，启动并行处理
-                            if len(files_to_process) >= self.config.batch_size:
-                                self._process_files_batch(files_to_process)
-                                files_to_process = []  # 清空列表
-                            
-                        except (OSError, IOError) as e:
-                            logger.error(f"获取文件状态失败 {file_path}: {e}")
-                            self.error_files += 1
-                        except Exception as e:
-                            logger.error(f"处理文件失败 {file_path}: {e}")
-                            self.error_files += 1
+                # 循环内使用的属性提前绑定到局部变量，减少每个文件的查找开销
+                known_mtime = known_mtimes.get
+                batch_size = self.config.batch_size
+                skipped = 0
+                
+                # 遍历目录（单次遍历，边遍历边分批处理）
+                for entry in _iter_file_entries(monitor_path, self.config.thread_pool_size,
+                                                self.config.match_ignore):
+                    file_path = entry.path
+                    try:
+                        # 获取文件状态（遍历时已预取）
+                        stat = entry.stat()
+                        
+                        # 已记录且修改时间未变化的文件跳过
+                        if known_mtime(file_path) == int(stat.st_mtime):
+                            skipped += 1
+                            continue
+                        
+                        # 添加到待处理列表
+                        self.total_files += 1
+                        files_to_process.append((file_path, stat))
+                        
+                        # 当收集到足够的文件时，启动并行处理
+                        if len(files_to_process) >= batch_size:
+                            self.skipped_files += skipped
+                            skipped = 0
+                            self._process_files_batch(files_to_process)
+                            files_to_process = []  # 清空列表
+                        
+                    except (OSError, IOError) as e:
+                        logger.error(f"获取文件状态失败 {file_path}: {e}")
+                        self.error_files += 1
+                    except Exception as e:
+                        logger.error(f"处理文件失败 {file_path}: {e}")
+                        self.error_files += 1
                 
                 # 处理剩余的文件
+                self.skipped_files += skipped
                 if files_to_process:
                     self._process_files_batch(files_to_process)
                 
@@ -346,7 +803,7 @@ class LocalMonitor:
                     f"完成目录扫描: {monitor_path}\n"
                     f"总耗时: {total_time:.1f}秒\n"
                     f"平均速度: {avg_speed:.1f} 文件/秒\n"
-                    f"处理文件: {self.processed_files}\n"
+                    f"处理文件: {self.processed_files}（新增 {self.added_files}，更新 {self.updated_files}）\n"
                     f"跳过文件: {self.skipped_files}\n"
                     f"错误文件: {self.error_files}"
                 )
@@ -357,16 +814,25 @@ class LocalMonitor:
     def start(self) -> None:
         """启动监控"""
         try:
-            # 启动文件系统观察者
+            # 启动事件合并器和文件系统观察者
+            self.event_handler.start()
             self.observer.start()
             logger.info("启动文件系统监控")
             
             # 首次扫描
             self._scan_files()
             
-            # 定期扫描
+            # 定期扫描：下一次扫描时间在上一次计划时间上累加，不受扫描耗时影响
+            next_tick = time.monotonic()
             while True:
-                time.sleep(self.polling_interval)
+                next_tick += self.polling_interval
+                delay = next_tick - time.monotonic()
+                if delay < 0:
+                    # 扫描耗时超过轮询间隔时不补做错过的扫描，从当前时间重新计时
+                    logger.warning(f"本地扫描耗时超过轮询间隔 {-delay:.1f} 秒")
+                    next_tick = time.monotonic()
+                    delay = 0
+                time.sleep(delay)
                 self._scan_files()
                 
         except Exception as e:
@@ -380,6 +846,9 @@ class LocalMonitor:
             self.observer.stop()
             self.observer.join()
             
+            # 处理尚在合并窗口中的事件，停止延后删除的后台线程
+            self.event_handler.stop()
+            
             # 关闭线程池
             self.executor.shutdown(wait=True)
             
@@ -3,7 +3,6 @@ import sys
 import signal
 import argparse
 import threading
-import time
 from typing import Optional
 from utils.logging_utils import logger, setup_logging
 from config import Config
@@ -31,6 +30,9 @@ class GrayLink:
         self.config = Config.load_from_yaml(config_file)
         logger.info("配置加载完成")
         
+        # 确保数据库目录和软链接目录存在
+        self.config.ensure_dirs()
+        
         self.db_manager = DatabaseManager(self.config.db_path)
         logger.info("数据库初始化成功")
         
@@ -153,7 +155,8 @@ class GrayLink:
                     logger.error("所有监控线程已停止")
                     break
                 
-                time.sleep(1)
+                # stop() 设置停止标志后立即返回，无需等满间隔
+                self._stop_flag.wait(1)
             
         except Exception as e:
             logger.error(f"启动服务失败: {e}")
@@ -184,6 +187,10 @@ class GrayLink:
             # 清空线程列表
             self._monitor_threads.clear()
             
+            # 关闭数据库连接
+            if hasattr(self, 'db_manager') and self.db_manager:
+                self.db_manager.close()
+            
         except Exception as e:
             logger.error(f"停止服务失败: {e}")
             raise
@@ -261,6 +268,7 @@ def main():
     parser.add_argument("--full-scan", action="store_true", help="执行完整扫描")
     parser.add_argument("--export-html", metavar="PATH", help="导出HTML快照")
     parser.add_argument("--export-json", metavar="PATH", help="导出JSON快照")
+    parser.add_argument("--compile-config", action="store_true", help="将配置文件生成为Python模块以加快启动")
     
     # 解析命令行参数
     args = parser.parse_args()
@@ -270,6 +278,15 @@ def main():
         print(f"配置文件不存在: {args.config}")
         sys.exit(1)
     
+    # 生成配置模块
+    if args.compile_config:
+        try:
+            Config.compile_to_module(args.config)
+            sys.exit(0)
+        except Exception as e:
+            print(f"生成配置模块失败: {e}")
+            sys.exit(1)
+    
     try:
         # 创建应用实例
         app = GrayLink(args.config)
@@ -3,11 +3,14 @@ import time
 import threading
 from queue import Queue
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from utils.logging_utils import logger
 from db_manager import DatabaseManager
 from config import Config
 
+# 数据库批量写入的记录数
+DB_BATCH_SIZE = 1000
+
 class SnapshotGenerator:
     """目录树生成器"""
     
@@ -35,7 +38,7 @@ class SnapshotGenerator:
         self._size_lock = threading.Lock()
         
         # 确保软链接目录存在
-        os.makedirs(self.config.symlink_base_path, exist_ok=True)
+        self.config.ensure_dirs()
     
     def _increment_stats(self, size: int) -> None:
         """线程安全地更新统计信息"""
@@ -44,12 +47,15 @@ class SnapshotGenerator:
         with self._size_lock:
             self.total_size += size
     
-    def _create_symlink(self, source_path: str) -> None:
+    def _create_symlink(self, source_path: str) -> Optional[Tuple[str, str]]:
         """
         创建软链接
         
         Args:
             source_path: 源文件路径
+            
+        Returns:
+            Optional[Tuple[str, str]]: (源文件路径, 软链接路径)，未创建时返回None
         """
         try:
             # 构建目标路径（使用与软链接模块相同的规则）
@@ -64,17 +70,18 @@ class SnapshotGenerator:
                 os.unlink(target_path)
             elif os.path.exists(target_path):
                 logger.warning(f"目标路径已存在且不是软链接，跳过: {target_path}")
-                return
+                return None
             
             # 创建软链接
             os.symlink(source_path, target_path)
             logger.debug(f"创建软链接: {target_path} -> {source_path}")
             
-            # 记录到数据库
-            self.db_manager.add_symlink(source_path, target_path)
+            # 由调用方批量记录到数据库
+            return source_path, target_path
             
         except Exception as e:
             logger.error(f"创建软链接失败 {source_path}: {e}")
+            return None
     
     def _should_process_file(self, path: str) -> bool:
         """
@@ -91,10 +98,9 @@ class SnapshotGenerator:
             return False
             
         # 检查是否匹配排除模式
-        for pattern in self.config.exclude_patterns:
-            if pattern.strip('*') in path:
-                logger.debug(f"文件匹配排除规则，跳过处理: {path}")
-                return False
+        if self.config.match_exclude(path):
+            logger.debug(f"文件匹配排除规则，跳过处理: {path}")
+            return False
         
         # 检查文件扩展名是否匹配
         ext = os.path.splitext(path)[1].lower()  # 获取扩展名（包含点号）
@@ -108,11 +114,19 @@ class SnapshotGenerator:
             
         return True
     
-    def _process_file(self, path: str) -> None:
-        """处理单个文件"""
+    def _process_file(self, path: str) -> Optional[Tuple[str, int, float, Optional[str]]]:
+        """
+        处理单个文件
+        
+        Args:
+            path: 文件路径
+            
+        Returns:
+            Optional[Tuple[str, int, float, Optional[str]]]: 待写入数据库的文件记录，不需要处理时返回None
+        """
         try:
             if not self._should_process_file(path):
-                return
+                return None
                 
             # 获取文件信息
             stat = os.stat(path)
@@ -120,15 +134,12 @@ class SnapshotGenerator:
             # 更新统计信息
             self._increment_stats(stat.st_size)
             
-            # 更新数据库
-            self.db_manager.add_file(
-                path,
-                stat.st_size,
-                stat.st_mtime
-            )
+            # 由调用方批量写入数据库
+            return path, stat.st_size, stat.st_mtime, None
             
         except Exception as e:
             logger.error(f"处理文件失败 {path}: {e}")
+            return None
     
     def _process_directory(self, path: str, executor: ThreadPoolExecutor) -> None:
         """
@@ -157,11 +168,17 @@ class SnapshotGenerator:
                     futures.append(future)
                     
             # 等待当前目录的所有文件处理完成
+            rows = []
             for future in futures:
                 try:
-                    future.result()  # 等待任务完成并检查异常
+                    row = future.result()  # 等待任务完成并检查异常
+                    if row:
+                        rows.append(row)
                 except Exception as e:
                     logger.error(f"处理文件失败: {e}")
+            
+            # 批量更新数据库
+            self.db_manager.add_files_bulk(rows)
                     
         except Exception as e:
             logger.error(f"处理目录失败 {path}: {e}")
@@ -195,13 +212,21 @@ class SnapshotGenerator:
                     else:
                         skipped_files += 1
                 
-                # 等待所有任务完成
+                # 等待所有任务完成，按批记录到数据库
+                links = []
                 for future in futures:
                     try:
-                        future.result()
-                        total_links += 1
+                        link = future.result()
+                        if link:
+                            links.append(link)
+                            total_links += 1
+                            if len(links) >= DB_BATCH_SIZE:
+                                self.db_manager.add_symlinks_bulk(links)
+                                links = []
                     except Exception as e:
                         logger.error(f"创建软链接失败: {e}")
+                
+                self.db_manager.add_symlinks_bulk(links)
             
             # 输出统计信息
             elapsed_time = time.time() - start_time
@@ -256,17 +281,21 @@ class SnapshotGenerator:
                                 completed = sum(1 for f in futures if f.done())
                                 logger.info(f"已处理: {completed}/{len(futures)} 文件")
                 
-                # 等待所有任务完成
+                # 等待所有任务完成，按批写入数据库（统计信息已在 _process_file 中更新）
+                rows = []
                 for future in as_completed(futures):
                     try:
                         # 获取任务结果
-                        result = future.result()
-                        if result:
-                            file_size = result
-                            self.total_files += 1
-                            self.total_size += file_size
+                        row = future.result()
+                        if row:
+                            rows.append(row)
+                            if len(rows) >= DB_BATCH_SIZE:
+                                self.db_manager.add_files_bulk(rows)
+                                rows = []
                     except Exception as e:
                         logger.error(f"处理文件时发生错误: {e}")
+                
+                self.db_manager.add_files_bulk(rows)
             
             logger.info(f"扫描完成! 共处理 {self.total_files} 个文件, 总大小: {self.total_size / (1024*1024*1024):.2f} GB")
             return True
@@ -21,6 +21,7 @@ class SymlinkManager:
             on_symlink_change: 软链接变化回调函数（用于通知Emby），参数为(路径, 是否删除)
         """
         self.db_manager = db_manager
+        self.config = config
         self.base_path = os.path.abspath(config.symlink_base_path)
         self.file_patterns = {p.lower() for p in config.file_patterns}
         self.exclude_patterns = config.exclude_patterns
@@ -28,9 +29,7 @@ class SymlinkManager:
         self.on_symlink_change = on_symlink_change
         
         # 确保基础路径存在
-        if not os.path.exists(self.base_path):
-            os.makedirs(self.base_path)
-            logger.info(f"创建软链接基础路径: {self.base_path}")
+        config.ensure_dirs()
     
     def _should_process_file(self, path: str) -> bool:
         """
@@ -46,20 +45,12 @@ class SymlinkManager:
         if not os.path.isfile(path):
             return False
             
-        # 检查是否匹配排除模式
-        for pattern in self.exclude_patterns:
-            if pattern.strip('*') in path:
-                logger.debug(f"文件匹配排除规则，跳过处理: {path}")
-                return False
-        
-        # 检查文件扩展名是否匹配
-        ext = os.path.splitext(path)[1].lower()
-        for pattern in self.file_patterns:
-            if pattern.endswith(ext):
-                return True
+        # 检查文件模式和排除模式（先做子串和扩展名预过滤）
+        if not self.config.match_file(path):
+            logger.debug(f"文件不匹配文件模式或匹配排除规则，跳过处理: {path}")
+            return False
         
-        logger.debug(f"文件扩展名不匹配，跳过处理: {path}")
-        return False
+        return True
     
     def _get_relative_path(self, path: str) -> str:
         """
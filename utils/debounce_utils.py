@@ -0,0 +1,111 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from utils.logging_utils import logger
+
+
+class Debouncer:
+    """
+    事件合并器：同一个键在合并窗口内重复出现时只触发一次（携带最后一次提交的值），
+    窗口内无新事件后由后台线程批量调用回调
+    """
+
+    def __init__(self,
+                 callback: Callable[[List[Tuple[Hashable, Any]]], None],
+                 delay: float,
+                 name: str = "Debouncer"):
+        """
+        初始化事件合并器
+
+        Args:
+            callback: 批量回调函数，参数为到期的(键, 值)列表（按最后出现时间排序）
+            delay: 合并窗口（秒）
+            name: 后台线程名称
+        """
+        self.callback = callback
+        self.delay = delay
+        self.name = name
+        # 键 -> (到期时间, 值)；重新出现的键会移到末尾，因此到期时间按插入顺序递增
+        self._pending: Dict[Hashable, Tuple[float, Any]] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """启动后台线程"""
+        with self._cond:
+            self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def enqueue(self, key: Hashable, value: Any = None) -> None:
+        """
+        提交事件，窗口内重复提交会推迟该键的触发时间并覆盖其值
+
+        Args:
+            key: 事件键（如文件路径）
+            value: 事件值（如是否删除）
+        """
+        with self._cond:
+            self._pending.pop(key, None)
+            self._pending[key] = (time.monotonic() + self.delay, value)
+            self._cond.notify()
+
+    def stop(self, flush: bool = True) -> None:
+        """
+        停止后台线程
+
+        Args:
+            flush: 是否立即触发尚未到期的事件
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+        with self._cond:
+            items = [(key, value) for key, (_, value) in self._pending.items()]
+            self._pending.clear()
+        if flush and items:
+            self._fire(items)
+
+    def _run(self) -> None:
+        """后台线程：等待最早的事件到期后批量触发"""
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if not self._pending:
+                        self._cond.wait()
+                        continue
+                    remaining = next(iter(self._pending.values()))[0] - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopped:
+                    return
+
+                now = time.monotonic()
+                items = []
+                for key, (deadline, value) in self._pending.items():
+                    if deadline > now:
+                        break
+                    items.append((key, value))
+                for key, _ in items:
+                    del self._pending[key]
+
+            self._fire(items)
+
+    def _fire(self, items: List[Tuple[Hashable, Any]]) -> None:
+        """
+        调用回调，异常只记录日志，不影响后台线程
+
+        Args:
+            items: 到期的(键, 值)列表
+        """
+        try:
+            self.callback(items)
+        except Exception as e:
+            logger.error(f"{self.name} 回调执行失败: {e}")
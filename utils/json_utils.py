@@ -0,0 +1,47 @@
+import json
+from typing import Any, Union
+
+# 优先使用C实现的orjson，未安装时回退到标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    序列化为JSON（UTF-8字节串）
+
+    Args:
+        obj: 需要序列化的对象
+        indent: 是否使用2个空格缩进
+
+    Returns:
+        bytes: JSON字节串
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, default=str, option=option)
+
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=None if indent else (',', ':'),
+        default=str
+    ).encode('utf-8')
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    反序列化JSON
+
+    Args:
+        data: JSON字节串或字符串
+
+    Returns:
+        Any: 反序列化后的对象
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)